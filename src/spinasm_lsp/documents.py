@@ -0,0 +1,258 @@
+"""Coordination of parsing for individual documents."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from spinasm_lsp.lines import LineMap
+from spinasm_lsp.parser import SPINAsmParser
+from spinasm_lsp.scheduler import Priority
+
+ParseFunc = Callable[[str, Priority, threading.Event], Awaitable[SPINAsmParser]]
+
+
+@dataclass(frozen=True)
+class DocumentSnapshot:
+    """An immutable parsed version of a document, tagged with its version."""
+
+    version: int | None
+    source: str
+    parser: SPINAsmParser
+
+
+@dataclass
+class _ParseJob:
+    """A scheduled parse of one version of a document."""
+
+    version: int | None
+    task: asyncio.Task | None = None
+    cancelled: threading.Event = field(default_factory=threading.Event)
+
+    waiters: int = 0
+    """The number of requests waiting on the result."""
+
+    def cancel(self) -> None:
+        """Stop the parse, whether it is queued or running."""
+        self.cancelled.set()
+        if self.task is not None:
+            self.task.cancel()
+
+
+def _code(line: str) -> str | None:
+    """
+    Return the part of a line read by the assembler, without its comment or trailing
+    whitespace. Lines with quotes return None, since they may quote a comment marker.
+    """
+    code = line.partition(";")[0].rstrip()
+    if "'" in code or '"' in code:
+        return None
+    return code
+
+
+def _code_lines(lines: list[str], start: int, stop: int) -> list[tuple[int, str]]:
+    """Return the index and code of each line with code in a range of lines."""
+    code_lines = []
+    for i in range(start, stop):
+        # Lines with quotes only match if they're unchanged
+        if (code := _code(lines[i])) is None:
+            code = lines[i]
+        if code:
+            code_lines.append((i, code))
+
+    return code_lines
+
+
+def _line_map(old: str, new: str) -> LineMap | None:
+    """
+    Map the lines of one source to another, if they differ only in comments,
+    whitespace, and lines without code.
+
+    Sources that differ this way produce identical tokens, so one can reuse the parse
+    of the other with its lines moved. If the code changed, None is returned.
+    """
+    old_lines, new_lines = old.split("\n"), new.split("\n")
+
+    # Only the lines between the unchanged start and end of the source can differ
+    shortest = min(len(old_lines), len(new_lines))
+    prefix = 0
+    while prefix < shortest and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < shortest - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]
+    ):
+        suffix += 1
+
+    old_code = _code_lines(old_lines, prefix, len(old_lines) - suffix)
+    new_code = _code_lines(new_lines, prefix, len(new_lines) - suffix)
+    if [code for _, code in old_code] != [code for _, code in new_code]:
+        return None
+
+    # Unchanged lines and lines with code keep their place, while everything else in
+    # between was deleted or inserted
+    runs = [(0, 0, prefix)]
+    runs += [
+        (old_line, new_line, 1)
+        for (old_line, _), (new_line, _) in zip(old_code, new_code)
+    ]
+    runs.append((len(old_lines) - suffix, len(new_lines) - suffix, suffix))
+
+    return LineMap([run for run in runs if run[2]])
+
+
+def _only_comments_changed(old: str, new: str) -> bool:
+    """
+    Check if two sources differ only in comments and trailing whitespace.
+
+    Sources that differ this way produce identical tokens at identical positions, so
+    one can reuse the parse of the other.
+    """
+    return (
+        len(old.split("\n")) == len(new.split("\n"))
+        and (lines := _line_map(old, new)) is not None
+        and not lines
+    )
+
+
+def _is_newer(version: int | None, than: int | None) -> bool:
+    """Check if a version is at least as new as another. Unknown versions always are."""
+    return version is None or than is None or version >= than
+
+
+class DocumentActor:
+    """
+    Coordinate parsing of a single document.
+
+    Parses of a document run one at a time in the order that versions are received,
+    and each distinct source is only parsed once, no matter how many requests are
+    waiting on it. Versions that only change comments or trailing whitespace reuse the
+    previous parse, and versions that also insert or delete lines without code move
+    the previous parse to the new lines. Versions that are superseded by a newer
+    version before anyone requests them are abandoned. Different documents use
+    separate actors, so they are parsed in parallel.
+
+    Parameters
+    ----------
+    parse : ParseFunc
+        An async function that parses a source at a priority, stopping early if the
+        given event is set.
+    on_update : Callable[[SPINAsmParser], None]
+        Called when a newer snapshot of the document is available.
+    on_error : Callable[[BaseException], None]
+        Called when parsing fails unexpectedly.
+    """
+
+    def __init__(
+        self,
+        parse: ParseFunc,
+        on_update: Callable[[SPINAsmParser], None],
+        on_error: Callable[[BaseException], None],
+    ):
+        self._parse = parse
+        self._on_update = on_update
+        self._on_error = on_error
+        self._lock = asyncio.Lock()
+        self._jobs: dict[str, _ParseJob] = {}
+        self._newest: _ParseJob | None = None
+        self._closed = False
+
+        self.snapshot: DocumentSnapshot | None = None
+        """The newest parsed version of the document."""
+
+    def update(self, source: str, version: int | None, priority: Priority) -> None:
+        """Schedule a parse of a new version without waiting for the result."""
+        if self.snapshot is None or self.snapshot.source != source:
+            self._get_job(source, version, priority)
+
+    async def get(
+        self, source: str, version: int | None, priority: Priority
+    ) -> SPINAsmParser:
+        """Return the parser for a version of the document, parsing it if needed."""
+        if self.snapshot is not None and self.snapshot.source == source:
+            return self.snapshot.parser
+
+        job = self._get_job(source, version, priority)
+        job.waiters += 1
+        try:
+            # Shield the shared task so that one cancelled request doesn't cancel the
+            # parse for everyone else.
+            return await asyncio.shield(job.task)  # type: ignore[arg-type]
+        finally:
+            job.waiters -= 1
+            self._abandon_superseded()
+
+    def close(self) -> None:
+        """Abandon all pending parses and stop publishing updates."""
+        self._closed = True
+        for job in self._jobs.values():
+            job.cancel()
+        self._jobs.clear()
+
+    def _get_job(
+        self, source: str, version: int | None, priority: Priority
+    ) -> _ParseJob:
+        """Return the job that parses the source, scheduling it if needed."""
+        if (job := self._jobs.get(source)) is not None:
+            return job
+
+        job = _ParseJob(version=version)
+        job.task = asyncio.ensure_future(self._run(job, source, priority))
+        job.task.add_done_callback(self._report_error)
+        self._jobs[source] = job
+
+        if self._newest is None or _is_newer(version, self._newest.version):
+            self._newest = job
+            self._abandon_superseded()
+
+        return job
+
+    def _abandon_superseded(self) -> None:
+        """Cancel jobs for older versions that no request is waiting on."""
+        for source, job in list(self._jobs.items()):
+            if job is not self._newest and job.waiters == 0:
+                job.cancel()
+                del self._jobs[source]
+
+    async def _run(
+        self, job: _ParseJob, source: str, priority: Priority
+    ) -> SPINAsmParser:
+        """Parse the source once earlier versions have been parsed."""
+        try:
+            async with self._lock:
+                # Edits to comments, whitespace, and lines without code don't change
+                # the tokens, so the last parse is reused or moved without re-running
+                # the assembler. Degraded parses depend on the size of the whole
+                # source, so those are always redone.
+                if (
+                    self.snapshot is not None
+                    and self.snapshot.parser.degraded is None
+                    and (lines := _line_map(self.snapshot.source, source)) is not None
+                ):
+                    parser = (
+                        self.snapshot.parser.moved(lines)
+                        if lines
+                        else self.snapshot.parser
+                    )
+                else:
+                    parser = await self._parse(source, priority, job.cancelled)
+        finally:
+            if self._jobs.get(source) is job:
+                del self._jobs[source]
+
+        if not self._closed and (
+            self.snapshot is None or _is_newer(job.version, self.snapshot.version)
+        ):
+            self.snapshot = DocumentSnapshot(
+                version=job.version, source=source, parser=parser
+            )
+            self._on_update(parser)
+
+        return parser
+
+    def _report_error(self, task: asyncio.Task) -> None:
+        """Report unexpected errors, even if no request was waiting on the result."""
+        if not task.cancelled() and (exc := task.exception()) is not None:
+            self._on_error(exc)
@@ -0,0 +1,100 @@
+"""Bulk reading of patch files for workspace-scale parsing."""
+
+from __future__ import annotations
+
+import functools
+import mmap
+import os
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Sequence
+
+import lsprotocol.types as lsp
+
+from spinasm_lsp.parser import SPINAsmParser
+
+# Mapping a file has a fixed cost that outweighs a single read for small files, so
+# only files at least this large are memory-mapped.
+MMAP_THRESHOLD = 64 * 1024
+
+
+def read_source(path: str | os.PathLike) -> str:
+    """
+    Read and decode a patch in one pass, preserving line endings.
+
+    Small files are read with a single unbuffered read sized to the file, and larger
+    files are memory-mapped and decoded directly from the mapping. Undecodable bytes
+    are replaced rather than raising.
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(fd).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+                return str(mapped, "utf-8", "replace")
+
+        # Request an extra byte to detect files that grew since they were measured
+        data = os.read(fd, size + 1)
+        if len(data) > size:
+            chunks = [data]
+            while chunk := os.read(fd, MMAP_THRESHOLD):
+                chunks.append(chunk)
+            data = b"".join(chunks)
+    finally:
+        os.close(fd)
+
+    return data.decode("utf-8", errors="replace")
+
+
+def read_lines(path: str | os.PathLike) -> list[str]:
+    """Read a patch as lines, split the same way the parser splits a source."""
+    return read_source(path).split("\n")
+
+
+def read_many(
+    paths: Iterable[str | os.PathLike],
+) -> Iterator[tuple[Path, list[str]]]:
+    """Read the lines of each patch, skipping files that can't be read."""
+    for path in paths:
+        try:
+            lines = read_lines(path)
+        except OSError:
+            continue
+        yield Path(path), lines
+
+
+def parse_many(
+    paths: Iterable[str | os.PathLike], **kwargs
+) -> Iterator[tuple[Path, SPINAsmParser]]:
+    """Parse each readable patch, passing keyword arguments to the parser."""
+    for path, lines in read_many(paths):
+        yield path, SPINAsmParser(lines, **kwargs)
+
+
+def _diagnose(
+    path: str | os.PathLike, **kwargs: Any
+) -> tuple[Path, Sequence[lsp.Diagnostic]] | None:
+    """Parse a patch and return its diagnostics, or None if it can't be read."""
+    try:
+        lines = read_lines(path)
+    except OSError:
+        return None
+    return Path(path), SPINAsmParser(lines, **kwargs).diagnostics
+
+
+def diagnose_many(
+    paths: Iterable[str | os.PathLike], executor: Executor | None = None, **kwargs
+) -> Iterator[tuple[Path, Sequence[lsp.Diagnostic]]]:
+    """
+    Parse each readable patch and return its diagnostics, in order.
+
+    Patches are parsed independently, so with an executor, e.g. a process pool, each
+    patch can be parsed in parallel. Only the diagnostics are sent back from workers,
+    which is much cheaper than sending the parsers. Keyword arguments are passed to the
+    parser, and must be picklable to use a process pool.
+    """
+    diagnose = functools.partial(_diagnose, **kwargs)
+    results = (
+        map(diagnose, paths) if executor is None else executor.map(diagnose, paths)
+    )
+    yield from (result for result in results if result is not None)
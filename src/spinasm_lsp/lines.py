@@ -0,0 +1,113 @@
+"""Tracking of line numbers as lines without code are inserted and deleted."""
+
+from __future__ import annotations
+
+import bisect
+from typing import Sequence
+
+import lsprotocol.types as lsp
+
+
+class LineMap:
+    """
+    A map from the lines of a parsed source to the lines of an edited source.
+
+    Inserting or deleting lines without code moves the lines that have code, but
+    doesn't change their tokens. Rather than storing the new line of every line, the
+    map stores each run of lines that moved together, so mapping a line in either
+    direction is a binary search over the runs. Lines outside of every run were
+    deleted from the parsed source or inserted into the edited source.
+
+    Parameters
+    ----------
+    runs : Sequence[tuple[int, int, int]]
+        The first original line, first current line, and number of lines of each run,
+        in ascending order.
+    """
+
+    def __init__(self, runs: Sequence[tuple[int, int, int]]):
+        merged: list[tuple[int, int, int]] = []
+        for original, current, length in runs:
+            # Adjacent runs that moved the same distance are one run
+            if merged and merged[-1][0] + merged[-1][2] == original:
+                last_original, last_current, last_length = merged[-1]
+                if last_current + last_length == current:
+                    merged[-1] = (last_original, last_current, last_length + length)
+                    continue
+            merged.append((original, current, length))
+
+        self._runs = tuple(merged)
+        self._originals = tuple(run[0] for run in self._runs)
+        self._currents = tuple(run[1] for run in self._runs)
+
+    def __bool__(self) -> bool:
+        """Check if any line moved."""
+        return any(original != current for original, current, _ in self._runs)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, LineMap):
+            return NotImplemented
+        return self._runs == other._runs
+
+    def __repr__(self) -> str:
+        return f"LineMap({list(self._runs)})"
+
+    @property
+    def runs(self) -> Sequence[tuple[int, int, int]]:
+        """The first original line, first current line, and length of each run."""
+        return self._runs
+
+    def offset(self, line: int) -> int:
+        """
+        Return how far an original line moved.
+
+        Deleted lines move as far as the closest run before them.
+        """
+        if (i := bisect.bisect_right(self._originals, line) - 1) < 0:
+            return 0
+        original, current, _ = self._runs[i]
+        return current - original
+
+    def to_current(self, line: int) -> int:
+        """Return the current line of an original line."""
+        return line + self.offset(line)
+
+    def to_original(self, line: int) -> int | None:
+        """Return the original line at a current line, or None if it was inserted."""
+        if (i := bisect.bisect_right(self._currents, line) - 1) < 0:
+            return None
+        original, current, length = self._runs[i]
+        return original + line - current if line < current + length else None
+
+    def move_range(self, range: lsp.Range) -> lsp.Range:
+        """Return a range moved to the current line of its start."""
+        if not (lines := self.offset(range.start.line)):
+            return range
+
+        start, end = range.start, range.end
+        return lsp.Range(
+            start=lsp.Position(line=start.line + lines, character=start.character),
+            end=lsp.Position(line=end.line + lines, character=end.character),
+        )
+
+    def then(self, other: LineMap) -> LineMap:
+        """Combine the map with a map of further edits to the current lines."""
+        runs = []
+        for original, current, length in self._runs:
+            # Only the lines of the run that both maps keep are kept
+            i = max(bisect.bisect_right(other._originals, current) - 1, 0)
+            for other_original, other_current, other_length in other._runs[i:]:
+                if other_original >= current + length:
+                    break
+                start = max(current, other_original)
+                stop = min(current + length, other_original + other_length)
+                if start < stop:
+                    runs.append(
+                        (
+                            original + start - current,
+                            other_current + start - other_original,
+                            stop - start,
+                        )
+                    )
+
+        return LineMap(runs)
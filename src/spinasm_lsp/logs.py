@@ -0,0 +1,95 @@
+"""Level-gated, batched messages to the client's output channel."""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Any
+
+from lsprotocol import types as lsp
+
+if TYPE_CHECKING:
+    from pygls.server import LanguageServer
+
+# Message types are ordered by verbosity, so a message is sent if its type is at or
+# below the current level.
+LOG_LEVELS = {
+    "off": 0,
+    "error": lsp.MessageType.Error,
+    "warning": lsp.MessageType.Warning,
+    "info": lsp.MessageType.Info,
+    "debug": lsp.MessageType.Log,
+}
+
+
+class MessageLog:
+    """
+    Messages logged to a client, filtered by level and sent in batches.
+
+    Messages below the current level are dropped before they're formatted. Messages
+    that are sent are buffered and flushed on the next iteration of the event loop,
+    with consecutive messages of the same type joined into a single notification.
+
+    Parameters
+    ----------
+    server : LanguageServer
+        The server to send messages through.
+    """
+
+    def __init__(self, server: LanguageServer):
+        self._server = server
+        self._buffer: list[tuple[lsp.MessageType, str]] = []
+        self._lock = threading.Lock()
+
+        self.level: int | None = None
+        """The most verbose message type to send, or None to follow the trace value."""
+
+    @property
+    def effective_level(self) -> int:
+        """The most verbose message type that's sent."""
+        if self.level is not None:
+            return self.level
+
+        # Debug messages are only sent when the client asks for verbose traces
+        if self._server.lsp.trace == lsp.TraceValues.Verbose:
+            return lsp.MessageType.Log
+        return lsp.MessageType.Info
+
+    def set_level(self, name: str) -> None:
+        """Set the level by name, e.g. `debug`, ignoring unrecognized names."""
+        if (level := LOG_LEVELS.get(name.lower())) is not None:
+            self.level = level
+
+    def enabled(self, msg_type: lsp.MessageType) -> bool:
+        """Return whether messages of a type would be sent."""
+        return msg_type <= self.effective_level
+
+    def log(self, msg_type: lsp.MessageType, msg: Any, *args: Any) -> None:
+        """
+        Log a message, formatting it with %-style arguments only if it will be sent.
+        """
+        if not self.enabled(msg_type):
+            return
+
+        message = str(msg) % args if args else str(msg)
+        with self._lock:
+            self._buffer.append((msg_type, message))
+            if len(self._buffer) > 1:
+                return
+
+        loop = self._server.loop
+        if loop.is_closed():
+            self.flush()
+        else:
+            loop.call_soon_threadsafe(self.flush)
+
+    def flush(self) -> None:
+        """Send all buffered messages."""
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+
+        batch: list[str] = []
+        for i, (msg_type, message) in enumerate(buffer):
+            batch.append(message)
+            if i + 1 == len(buffer) or buffer[i + 1][0] != msg_type:
+                self._server.show_message_log("\n".join(batch), msg_type)
+                batch = []
@@ -0,0 +1,71 @@
+"""Utilities for estimating the memory footprint of server state."""
+
+from __future__ import annotations
+
+import enum
+import sys
+import types
+from typing import Any
+
+# Objects of these types are shared or immutable module-level singletons, so they are
+# counted but never traversed.
+_OPAQUE_TYPES = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    enum.Enum,
+)
+
+
+def _slots(cls: type) -> list[str]:
+    """Return all slot names defined by a class and its bases."""
+    slots = []
+    for base in cls.__mro__:
+        base_slots = base.__dict__.get("__slots__", ())
+        slots += [base_slots] if isinstance(base_slots, str) else list(base_slots)
+
+    return slots
+
+
+def deep_sizeof(obj: Any) -> int:
+    """
+    Estimate the size of an object and everything it references, in bytes.
+
+    Each object is only counted once, even if it is referenced multiple times. Classes,
+    modules, functions, and enum members are counted but not traversed. Read-only
+    mappings and memory views are followed to the objects they expose.
+    """
+    seen: set[int] = set()
+    stack = [obj]
+    size = 0
+
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        if isinstance(current, _OPAQUE_TYPES):
+            continue
+        if isinstance(current, (dict, types.MappingProxyType)):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif isinstance(current, memoryview) and current.obj is not None:
+            # Views only report their own size, not the buffer they expose
+            stack.append(current.obj)
+
+        if hasattr(current, "__dict__"):
+            stack.append(vars(current))
+        stack.extend(
+            getattr(current, slot)
+            for slot in _slots(type(current))
+            if hasattr(current, slot)
+        )
+
+    return size
@@ -3,22 +3,194 @@
 from __future__ import annotations
 
 import contextlib
+import copy
+import re
+import shlex
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Iterator, Mapping, Sequence
 
 import lsprotocol.types as lsp
 from asfv1 import fv1parse
 
-from spinasm_lsp.tokens import ASFV1Token, LSPToken, ParsedToken, TokenLookup
+from spinasm_lsp.lines import LineMap
+from spinasm_lsp.tokens import (
+    ASFV1Token,
+    LSPToken,
+    OpcodeArguments,
+    ParsedToken,
+    SymbolReferences,
+    TokenLookup,
+    encode_semantics,
+    move_semantics,
+)
+
+# Characters outside the Basic Multilingual Plane, which occupy two UTF-16 code units
+_ASTRAL_CHARACTERS = re.compile("[\U00010000-\U0010ffff]")
+
+
+def _pad_astral_characters(source: str) -> str:
+    """
+    Pad each character outside the Basic Multilingual Plane with a second character.
+
+    This makes string indices match UTF-16 code units. The padding is a byte order
+    mark, which is ignored by asfv1.
+    """
+    return _ASTRAL_CHARACTERS.sub(lambda m: m.group() + "\ufeff", source)
+
+
+class ScanCache:
+    """
+    A bounded, thread-safe cache of the words scanned from each unique line of source.
+
+    Scanning splits a line into words and strips its comment, which depends only on
+    the line's text. Caching the words means that re-parsing a document, or parsing a
+    document with repeated lines, only scans lines that haven't been seen before.
+    Classifying words into tokens depends on the symbols defined so far, so that still
+    happens during each parse.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of lines to keep.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lines: OrderedDict[str, tuple[str, ...]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of scanned lines that were found in the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def scan(self, line: str) -> tuple[str, ...]:
+        """Return the words in a line, scanning it if it isn't cached."""
+        with self._lock:
+            if (words := self._lines.get(line)) is not None:
+                self.hits += 1
+                self._lines.move_to_end(line)
+                return words
+
+        # Scan the same way as asfv1
+        lexer = shlex.shlex(line)
+        lexer.commenters = ";"
+        words = tuple(lexer)
+
+        with self._lock:
+            self.misses += 1
+            self._lines[line] = words
+            while len(self._lines) > self.max_size:
+                self._lines.popitem(last=False)
+
+        return words
+
+
+SCAN_CACHE = ScanCache()
+"""The scan cache shared by parsers by default."""
+
+
+class ParsingCancelled(BaseException):
+    """
+    Raised when parsing is cancelled before it completes.
+
+    This inherits from BaseException so that it isn't caught by the broad exception
+    handling that asfv1 uses while parsing expressions.
+    """
+
+
+class ParseLimitExceeded(BaseException):
+    """
+    Raised when parsing exceeds a limit, with a message describing the limit.
+
+    Like cancellation, this inherits from BaseException to escape asfv1's exception
+    handling.
+
+    Parameters
+    ----------
+    limit : str
+        The name of the exceeded limit, e.g. `max_tokens`.
+    message : str
+        A description of the exceeded limit.
+    """
+
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+@dataclass(frozen=True)
+class ParseLimits:
+    """
+    Limits on parsing a program, above which its tokens are only scanned.
+
+    Scanning classifies and positions tokens for highlighting and reports invalid
+    input, but doesn't evaluate expressions, check instructions, or resolve symbols.
+    Each limit can be disabled with None.
+    """
+
+    max_bytes: int | None = 1_000_000
+    """The largest source to parse, in UTF-8 bytes."""
+
+    max_tokens: int | None = 20_000
+    """The most tokens to parse. Scanning also stops after this many tokens."""
+
+    time_budget: float | None = 5.0
+    """The longest time to spend parsing, in seconds."""
+
+    def check_size(self, source: str | Sequence[str]) -> str | None:
+        """Describe the limit a source exceeds before parsing, if any."""
+        if self.max_bytes is None:
+            return None
+
+        lines = [source] if isinstance(source, str) else source
+        size = sum(len(line.encode("utf-8", errors="surrogatepass")) for line in lines)
+        if size > self.max_bytes:
+            return f"File is larger than {self.max_bytes} bytes"
+        return None
+
+
+DEFAULT_PARSE_LIMITS = ParseLimits()
+
+MAX_SCAN_ERRORS = 100
+"""The most scan errors to report before scanning stops."""
 
 
 class SPINAsmPositionParser(fv1parse):
     """An SPINAsm parser that tracks zero-indexed parsing position."""
 
-    def __init__(self, *args, **kwargs):
+    # Words remaining on the line being parsed, set by asfv1
+    linebuf: list[str]
+
+    def __init__(
+        self,
+        source: str | Sequence[str],
+        scan_cache: ScanCache | None = SCAN_CACHE,
+        **kwargs,
+    ):
         # Current position during parsing
         self._current_character: int = 0
         self._previous_character: int = 0
 
-        super().__init__(*args, **kwargs)
+        # Scanned words of previously seen lines, or None to always scan
+        self._scan_cache = scan_cache
+
+        if isinstance(source, str):
+            super().__init__(source=source, **kwargs)
+        else:
+            # Lines that were already split don't need to be joined for asfv1 to split
+            super().__init__(source="", **kwargs)
+            self.source = list(source)
 
         # Store an unmodified version of the source for future reference
         self._source: list[str] = self.source.copy()
@@ -57,7 +229,23 @@ class SPINAsmPositionParser(fv1parse):
         # Store the current character before advancing to the next token.
         self._previous_character = self._current_character
 
-        super().__next__()
+        # asfv1 records the line of the previous symbol once it starts, which is
+        # restored after any lines skipped below.
+        prevline = self.sline
+        while True:
+            try:
+                # Fill the line buffer from the cache so that asfv1 doesn't scan the
+                # next line itself.
+                while self._scan_cache is not None and not self.linebuf and self.source:
+                    self.sline += 1
+                    self.linebuf = list(self._scan_cache.scan(self.source.pop(0)))
+                super().__next__()
+                break
+            except ValueError as e:
+                # Lines with unbalanced quotes can't be split into words. The line has
+                # already been taken from the source, so it's skipped.
+                self.scanerror(str(e))
+        self.prevline = prevline
 
         # Don't advance position on EOF token, since we're done parsing
         if self.parsed_symbol.type == "EOF":
@@ -79,23 +267,24 @@ class SPINAsmPositionParser(fv1parse):
 class SPINAsmDiagnosticParser(SPINAsmPositionParser):
     """An SPINAsm parser that logs warnings and errors as LSP diagnostics."""
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, source: str | Sequence[str], **kwargs):
         super().__init__(
-            *args,
+            source,
             # Ignore the callbacks in favor of overriding their callers
             wfunc=lambda *args, **kwargs: None,
             efunc=lambda *args, **kwargs: None,
             **kwargs,
         )
 
-        self.diagnostics: list[lsp.Diagnostic] = []
-        """A list of diagnostic messages generated during parsing."""
+        self._diagnostics: list[lsp.Diagnostic] = []
+        self.diagnostics: Sequence[lsp.Diagnostic] = self._diagnostics
+        """Diagnostic messages generated during parsing."""
 
     def _record_diagnostic(
         self, msg: str, *, position: lsp.Position, severity: lsp.DiagnosticSeverity
     ):
         """Record a diagnostic message for the LSP."""
-        self.diagnostics.append(
+        self._diagnostics.append(
             lsp.Diagnostic(
                 range=lsp.Range(start=position, end=position),
                 message=msg,
@@ -142,16 +331,191 @@ class SPINAsmDiagnosticParser(SPINAsmPositionParser):
         )
 
 
+class _MovedReferences(Mapping[str, SymbolReferences]):
+    """Symbol references that are moved to their current lines as they're retrieved."""
+
+    def __init__(self, references: Mapping[str, SymbolReferences], lines: LineMap):
+        self._references = references
+        self._lines = lines
+
+    def __getitem__(self, name: str) -> SymbolReferences:
+        references = self._references[name]
+        return SymbolReferences(
+            name=references.name,
+            defined=(
+                None
+                if references.defined is None
+                else self._lines.move_range(references.defined)
+            ),
+            ranges=tuple(map(self._lines.move_range, references.ranges)),
+            full_ranges=tuple(map(self._lines.move_range, references.full_ranges)),
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._references)
+
+    def __len__(self) -> int:
+        return len(self._references)
+
+
+class _MovedOpcodeArguments(Mapping[int, Sequence[OpcodeArguments]]):
+    """Opcode arguments that are looked up by their current line."""
+
+    def __init__(
+        self, arguments: Mapping[int, Sequence[OpcodeArguments]], lines: LineMap
+    ):
+        self._arguments = arguments
+        self._lines = lines
+
+    def __getitem__(self, line: int) -> Sequence[OpcodeArguments]:
+        if (original := self._lines.to_original(line)) is None:
+            raise KeyError(line)
+
+        return tuple(
+            OpcodeArguments(
+                opcode=arguments.opcode.moved(self._lines),
+                separators=arguments.separators,
+            )
+            for arguments in self._arguments[original]
+        )
+
+    def __iter__(self) -> Iterator[int]:
+        return map(self._lines.to_current, self._arguments)
+
+    def __len__(self) -> int:
+        return len(self._arguments)
+
+
 class SPINAsmParser(SPINAsmDiagnosticParser):
     """An SPINAsm parser with position, diagnostics, and additional LSP features."""
 
-    def __init__(self, source: str):
+    def __init__(
+        self,
+        source: str | Sequence[str],
+        compact: bool = True,
+        position_encoding: lsp.PositionEncodingKind = lsp.PositionEncodingKind.Utf32,
+        cancelled: threading.Event | None = None,
+        scan_cache: ScanCache | None = SCAN_CACHE,
+        limits: ParseLimits | None = None,
+    ):
+        # An event that can be set from another thread to abandon parsing
+        self._cancelled = cancelled
+
+        # The parser whose results were moved to create this one, and how they moved
+        self._unmoved: SPINAsmParser | None = None
+        self._line_map: LineMap | None = None
+
+        # Limits on parsing, and the time by which parsing must finish
+        self._limits = limits
+        self._deadline: float | None = None
+
+        # Positions are tracked as string indices, which match UTF-32 code units. Other
+        # encodings are handled by transforming the source once before parsing.
+        if position_encoding == lsp.PositionEncodingKind.Utf16:
+            source = (
+                _pad_astral_characters(source)
+                if isinstance(source, str)
+                else [_pad_astral_characters(line) for line in source]
+            )
+
+        self.degraded: str | None = None
+        """Why the program was only scanned rather than parsed, if it was."""
+
+        self.degraded_limit: str | None = None
+        """The name of the limit that caused the program to be scanned, if any."""
+
+        if limits is not None and (reason := limits.check_size(source)) is not None:
+            self.degraded, self.degraded_limit = reason, "max_bytes"
+
+        self._reset(source, scan_cache)
+        if self.degraded is None:
+            try:
+                self._parse_within_limits()
+            except ParseLimitExceeded as e:
+                # Start over, discarding the partial parse
+                self.degraded, self.degraded_limit = str(e), e.limit
+                self._reset(source, scan_cache)
+
+        if self.degraded is not None:
+            self._scan()
+        self._check_cancelled()
+
+        self.evaluated_tokens: TokenLookup[LSPToken] = self._evaluate_tokens()
+        """Tokens with additional metadata after evaluation."""
+        self._check_cancelled()
+
+        self.semantic_encoding: Sequence[int] = self._encode_semantics()
+        """Integer-encoded token semantics for semantic highlighting."""
+        self._check_cancelled()
+
+        self.symbol_references: Mapping[str, SymbolReferences] = (
+            self._index_references() if self.degraded is None else MappingProxyType({})
+        )
+        """User-definable symbols by name, with and without address modifiers."""
+
+        self.opcode_arguments: Mapping[int, Sequence[OpcodeArguments]] = (
+            self._index_opcode_arguments()
+        )
+        """Opcodes and their argument separator positions by line."""
+
+        self.document_symbols: Sequence[lsp.DocumentSymbol] = (
+            self._collect_definitions()
+        )
+        """One document symbol per user-defined variable, memory address, or label."""
+
+        if compact:
+            self._compact()
+
+        self._freeze()
+
+    def moved(self, lines: LineMap) -> SPINAsmParser:
+        """
+        Create a copy of the parser for a source where lines without code were inserted
+        or deleted.
+
+        Those edits don't change the tokens, so the copy shares the parsed results and
+        moves them to their current lines rather than parsing the source again.
+        """
+        unmoved = self._unmoved or self
+        if self._line_map is not None:
+            lines = self._line_map.then(lines)
+
+        parser = copy.copy(unmoved)
+        parser._unmoved = unmoved
+        parser._line_map = lines
+        parser.evaluated_tokens = unmoved.evaluated_tokens.moved(lines)
+        parser.semantic_encoding = move_semantics(unmoved.semantic_encoding, lines)
+        parser.symbol_references = _MovedReferences(unmoved.symbol_references, lines)
+        parser.opcode_arguments = _MovedOpcodeArguments(unmoved.opcode_arguments, lines)
+
+        document_symbols = []
+        for symbol in unmoved.document_symbols:
+            symbol = copy.copy(symbol)
+            symbol.range = lines.move_range(symbol.range)
+            symbol.selection_range = lines.move_range(symbol.selection_range)
+            document_symbols.append(symbol)
+        parser.document_symbols = tuple(document_symbols)
+
+        diagnostics = []
+        for diagnostic in unmoved.diagnostics:
+            diagnostic = copy.copy(diagnostic)
+            diagnostic.range = lines.move_range(diagnostic.range)
+            diagnostics.append(diagnostic)
+        parser.diagnostics = tuple(diagnostics)
+
+        return parser
+
+    def _reset(self, source: str | Sequence[str], scan_cache: ScanCache | None) -> None:
+        """Initialize the parser state for a source."""
         # Intermediate token definitions and lookups set during parsing
         self._definitions: dict[str, lsp.Range] = {}
         self._parsed_tokens: TokenLookup[ParsedToken] = TokenLookup()
+        self._token_count = 0
+        self._scan_errors = 0
 
         super().__init__(
             source=source,
+            scan_cache=scan_cache,
             clamp=True,
             spinreals=False,
         )
@@ -159,13 +523,108 @@ class SPINAsmParser(SPINAsmDiagnosticParser):
         # Store built-in constants that were defined at initialization.
         self._constants: list[str] = list(self.symtbl.keys())
 
-        super().parse()
+    def _parse_within_limits(self) -> None:
+        """Parse the program, raising if it exceeds the parsing limits."""
+        if self._limits is not None and self._limits.time_budget is not None:
+            self._deadline = time.perf_counter() + self._limits.time_budget
 
-        self.evaluated_tokens: TokenLookup[LSPToken] = self._evaluate_tokens()
-        """Tokens with additional metadata after evaluation."""
+        try:
+            super().parse()
+        finally:
+            self._deadline = None
 
-        self.semantic_encoding: list[int] = self._encode_semantics()
-        """Integer-encoded token semantics for semantic highlighting."""
+    def _scan(self) -> None:
+        """
+        Scan tokens without parsing them, up to the token or scan error limit.
+
+        Without parsing, memory addresses aren't defined, so address modifiers are
+        recognized by the names that follow each MEM directive instead. Symbols aren't
+        resolved, so there are no definitions or references.
+        """
+        self._record_diagnostic(
+            f"{self.degraded}, so only basic highlighting is available.",
+            position=lsp.Position(line=0, character=0),
+            severity=lsp.DiagnosticSeverity.Warning,
+        )
+
+        # The line of a MEM directive that hasn't been given a name yet
+        memory_line: int | None = None
+        previous: ASFV1Token | None = None
+        previous_line = 0
+        while True:
+            # Scanning stops at the token or error limit
+            try:
+                self.__next__()
+            except ParseLimitExceeded:
+                break
+
+            symbol = self.parsed_symbol
+            if symbol.type == "EOF":
+                break
+
+            # Memory can be declared as `MEM name size` or `name MEM size`
+            if symbol.type == "ASSEMBLER" and symbol.stxt == "MEM":
+                if (
+                    previous is not None
+                    and previous.type == "LABEL"
+                    and previous_line == self.sline
+                ):
+                    self._declare_memory(previous.stxt)
+                else:
+                    memory_line = self.sline
+            elif symbol.type == "LABEL" and memory_line == self.sline:
+                self._declare_memory(symbol.stxt)
+                memory_line = None
+
+            previous, previous_line = symbol, self.sline
+
+    def _declare_memory(self, name: str) -> None:
+        """Allow address modifiers on a memory name while scanning."""
+        # The symbol table is only read-only once parsing is finished
+        symtbl: dict[str, Any] = self.symtbl  # type: ignore[assignment]
+        symtbl.setdefault(f"{name}#", None)
+        symtbl.setdefault(f"{name}^", None)
+
+    def _count_token(self) -> None:
+        """Count a token or scan error, raising if it exceeds the token limit."""
+        max_tokens = self._limits.max_tokens if self._limits is not None else None
+        if self._token_count == max_tokens:
+            raise ParseLimitExceeded(
+                "max_tokens", f"File has more than {max_tokens} tokens"
+            )
+        self._token_count += 1
+
+    def scanerror(self, msg: str):
+        """
+        Record a scanning error, counting it toward the limits.
+
+        asfv1 skips unrecognized input without returning a token, so garbage input
+        would otherwise never reach a checkpoint.
+        """
+        self._check_cancelled()
+        self._count_token()
+        if self.degraded is not None:
+            if self._scan_errors == MAX_SCAN_ERRORS:
+                raise ParseLimitExceeded(
+                    "scan_errors", f"Scanning stopped after {MAX_SCAN_ERRORS} errors"
+                )
+            self._scan_errors += 1
+
+        super().scanerror(msg)
+
+    def _check_cancelled(self) -> None:
+        """Raise if parsing was cancelled or ran out of time."""
+        if self._cancelled is not None and self._cancelled.is_set():
+            raise ParsingCancelled
+        if (
+            self._deadline is not None
+            and self._limits is not None
+            and time.perf_counter() > self._deadline
+        ):
+            raise ParseLimitExceeded(
+                "time_budget",
+                f"Parsing took longer than {self._limits.time_budget:g} seconds",
+            )
 
     def __mkopcodes__(self):
         """
@@ -176,17 +635,23 @@ class SPINAsmParser(SPINAsmDiagnosticParser):
 
     def __next__(self):
         """Parse the next symbol and update the column and definitions."""
+        self._check_cancelled()
         super().__next__()
 
         # Don't store the EOF token
         if self.parsed_symbol.type == "EOF":
             return
 
+        self._count_token()
         token = self.parsed_symbol.at_position(
             start=lsp.Position(self._current_line, character=self._current_character),
         )
         self._parsed_tokens.add_token(token)
 
+        # Scanned symbols aren't resolved, so their definitions are unknown
+        if self.degraded is not None:
+            return
+
         base_token = token.without_address_modifier()
         is_user_definable = base_token.type in ("LABEL", "TARGET")
         is_defined = base_token.stxt in self.jmptbl or base_token.stxt in self.symtbl
@@ -200,13 +665,49 @@ class SPINAsmParser(SPINAsmDiagnosticParser):
         ):
             self._definitions[base_token.stxt] = base_token.range
 
+    def _compact(self) -> None:
+        """
+        Release intermediate parsing state that isn't needed after evaluation.
+
+        Evaluated tokens share their ranges with the parsed tokens, so dropping the
+        parsed tokens only releases the intermediate token objects and lookups.
+        """
+        self._parsed_tokens = TokenLookup()
+        self._scan_cache = None
+        self._definitions = {}
+        self._constants = []
+        self._source = []
+        self.source: list[str] = []
+        self.linebuf: list[str] = []
+        self.sym = None
+        # Opcode generation is skipped, so the parse list and program aren't needed
+        self.pl: list[dict] = []
+        self.program = bytearray()
+
+    def _freeze(self) -> None:
+        """
+        Prevent further changes to the parsed results.
+
+        A finished parser is shared between concurrent requests, so its results are
+        made read-only rather than relying on every reader to leave them alone.
+        """
+        self.diagnostics = tuple(self._diagnostics)
+        self.symtbl: Mapping[str, Any] = MappingProxyType(self.symtbl)
+        self.jmptbl: Mapping[str, Any] = MappingProxyType(self.jmptbl)
+
     def _evaluate_tokens(self) -> TokenLookup[LSPToken]:
         """Evaluate all parsed tokens to determine their values and metadata."""
         evaluated_tokens: TokenLookup[LSPToken] = TokenLookup()
 
         for token in self._parsed_tokens:
+            self._check_cancelled()
             value = self.jmptbl.get(token.stxt, self.symtbl.get(token.stxt, None))
-            defined_range = self._definitions.get(token.without_address_modifier().stxt)
+            # Scanned programs have no definitions, so skip looking them up
+            defined_range = (
+                self._definitions.get(token.without_address_modifier().stxt)
+                if self._definitions
+                else None
+            )
             evaluated_token = LSPToken.from_parsed_token(
                 token=token,
                 value=value,
@@ -217,22 +718,76 @@ class SPINAsmParser(SPINAsmDiagnosticParser):
 
             evaluated_tokens.add_token(evaluated_token)
 
+        evaluated_tokens.freeze()
         return evaluated_tokens
 
-    def _encode_semantics(self) -> list[int]:
-        """Encode the semantics of the parsed tokens for semantic highlighting."""
-        encoding: list[int] = []
-        prev_token_position = lsp.Position(0, 0)
+    def _index_opcode_arguments(self) -> Mapping[int, Sequence[OpcodeArguments]]:
+        """Index the argument separators following each opcode by line."""
+        separators: dict[int, list[tuple[LSPToken, list[int]]]] = {}
+
         for token in self.evaluated_tokens:
-            token_encoding = token.semantic_encoding(prev_token_position)
+            line = token.range.start.line
+            if token.is_opcode:
+                separators.setdefault(line, []).append((token, []))
+            elif token.type == "ARGSEP" and line in separators:
+                separators[line][-1][1].append(token.range.start.character)
+
+        return MappingProxyType(
+            {
+                line: tuple(
+                    OpcodeArguments(opcode=opcode, separators=tuple(positions))
+                    for opcode, positions in opcodes
+                )
+                for line, opcodes in separators.items()
+            }
+        )
+
+    def _collect_definitions(self) -> Sequence[lsp.DocumentSymbol]:
+        """Collect document symbols for all symbols defined in the program."""
+        symbols: list[lsp.DocumentSymbol] = []
+
+        for name, defined in self._definitions.items():
+            # Labels that were used but never defined aren't recorded in either table
+            if name not in self.symtbl and name not in self.jmptbl:
+                continue
+            if (token := self.evaluated_tokens.get(position=defined.start)) is None:
+                continue
+
+            symbols.append(token.document_symbol)
+
+        return tuple(
+            sorted(symbols, key=lambda s: (s.range.start.line, s.range.start.character))
+        )
+
+    def _index_references(self) -> Mapping[str, SymbolReferences]:
+        """Index the definition and occurrences of each user-definable symbol."""
+        occurrences: dict[str, list[LSPToken]] = {}
+        aliases: dict[str, str] = {}
 
-            # Tokens without semantic encoding (e.g. operators) should be ignored so
-            # that the next encoding is relative to the last encoded token. Otherwise,
-            # character offsets would be incorrect.
-            if not token_encoding:
+        for token in self.evaluated_tokens:
+            if token.type not in ("LABEL", "TARGET"):
                 continue
 
-            encoding += token_encoding
-            prev_token_position = token.range.start
+            base_name = token.without_address_modifier().stxt
+            occurrences.setdefault(base_name, []).append(token)
+            # Store modified names too, so that e.g. `Delay#` can be looked up directly
+            aliases.setdefault(base_name, base_name)
+            aliases[token.stxt] = base_name
+
+        references = {
+            name: SymbolReferences(
+                name=name,
+                defined=tokens[0].defined,
+                ranges=tuple(t.without_address_modifier().range for t in tokens),
+                full_ranges=tuple(t.range for t in tokens),
+            )
+            for name, tokens in occurrences.items()
+        }
 
-        return encoding
+        return MappingProxyType(
+            {alias: references[name] for alias, name in aliases.items()}
+        )
+
+    def _encode_semantics(self) -> Sequence[int]:
+        """Encode the semantics of the parsed tokens for semantic highlighting."""
+        return encode_semantics(self.evaluated_tokens, len(self.evaluated_tokens))
@@ -0,0 +1,73 @@
+"""Recording of JSON-RPC traffic between the server and its clients."""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, TextIO
+
+from pygls.protocol import JsonRPCProtocol
+
+
+class Recorder:
+    """
+    Record the messages exchanged with clients to a JSON lines file.
+
+    Each line holds the seconds since recording started, the session that exchanged
+    the message, which side sent it, and the message itself. Lines are written as soon
+    as they are recorded, so that sessions that end abruptly are still captured.
+
+    Parameters
+    ----------
+    path : str or PathLike
+        The file to record to, which is overwritten if it exists.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self._file: TextIO = open(path, "w", encoding="utf-8", buffering=1)  # noqa: SIM115
+        self._start = time.perf_counter()
+        self._sessions = itertools.count()
+        self._lock = threading.Lock()
+
+    def attach(self, protocol: JsonRPCProtocol) -> None:
+        """Record all messages received and sent by a protocol."""
+        session = next(self._sessions)
+        receive = protocol._procedure_handler
+        send = protocol._send_data
+
+        def record_received(message: Any) -> None:
+            self.record(session, "client", message, protocol)
+            receive(message)
+
+        def record_sent(data: Any) -> None:
+            if data:
+                self.record(session, "server", data, protocol)
+            send(data)
+
+        protocol._procedure_handler = record_received  # type: ignore[method-assign]
+        protocol._send_data = record_sent  # type: ignore[method-assign]
+
+    def record(
+        self, session: int, sender: str, message: Any, protocol: JsonRPCProtocol
+    ) -> None:
+        """Record a single message."""
+        line = json.dumps(
+            {
+                "time": round(time.perf_counter() - self._start, 6),
+                "session": session,
+                "from": sender,
+                "message": message,
+            },
+            default=protocol._serialize_message,
+        )
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+    def close(self) -> None:
+        """Stop recording."""
+        with self._lock:
+            self._file.close()
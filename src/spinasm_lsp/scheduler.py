@@ -0,0 +1,120 @@
+"""Prioritized scheduling of blocking work in a thread pool."""
+
+from __future__ import annotations
+
+import asyncio
+import enum
+import functools
+import heapq
+import itertools
+from concurrent.futures import Executor
+from typing import Any, Callable, TypeVar
+
+_T = TypeVar("_T")
+
+
+class Priority(enum.IntEnum):
+    """Priority classes for scheduled work, from highest to lowest."""
+
+    INTERACTIVE = 0
+    """Requests that a user is waiting on, e.g. hover or completion."""
+
+    DIAGNOSTICS = 1
+    """Diagnostics for documents that are open in the editor."""
+
+    BACKGROUND = 2
+    """Work that no one is waiting on, e.g. workspace indexing."""
+
+
+# Background work is limited to a single worker so that interactive requests always
+# have workers available.
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_LIMITS = {
+    Priority.INTERACTIVE: 4,
+    Priority.DIAGNOSTICS: 2,
+    Priority.BACKGROUND: 1,
+}
+
+
+class Scheduler:
+    """
+    Run blocking work in an executor, starting higher priority work first.
+
+    Parameters
+    ----------
+    executor : Executor
+        The executor that runs scheduled work.
+    max_workers : int
+        The maximum number of jobs that can run at once, across all priorities.
+    limits : dict[Priority, int], optional
+        The maximum number of jobs that can run at once for each priority.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        limits: dict[Priority, int] | None = None,
+    ):
+        self._executor = executor
+        self._max_workers = max_workers
+        self._limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self._running = {priority: 0 for priority in Priority}
+        self._pending: list[tuple[Priority, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    @property
+    def running(self) -> dict[Priority, int]:
+        """The number of running jobs for each priority."""
+        return self._running.copy()
+
+    async def run(
+        self, priority: Priority, func: Callable[..., _T], *args: Any, **kwargs: Any
+    ) -> _T:
+        """Run a function in the executor once a worker is available."""
+        await self._acquire(priority)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+        finally:
+            self._release(priority)
+
+    async def _acquire(self, priority: Priority) -> None:
+        """Wait until a worker is available for the given priority."""
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._pending, (priority, next(self._counter), waiter))
+        self._dispatch()
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Give the worker back if it was granted just before cancellation
+            if waiter.done() and not waiter.cancelled():
+                self._release(priority)
+            raise
+
+    def _release(self, priority: Priority) -> None:
+        """Release a worker and start the next pending job."""
+        self._running[priority] -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant workers to pending jobs in priority order."""
+        blocked = []
+
+        while self._pending and sum(self._running.values()) < self._max_workers:
+            priority, count, waiter = heapq.heappop(self._pending)
+            if waiter.done():
+                continue
+
+            if self._running[priority] >= self._limits[priority]:
+                blocked.append((priority, count, waiter))
+                continue
+
+            self._running[priority] += 1
+            waiter.set_result(None)
+
+        for item in blocked:
+            heapq.heappush(self._pending, item)
@@ -0,0 +1,144 @@
+"""Fast serialization of the server's largest responses."""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any
+
+import cattrs
+import lsprotocol.types as lsp
+from pygls.exceptions import JsonRpcInternalError
+from pygls.protocol import LanguageServerProtocol
+
+logger = logging.getLogger(__name__)
+
+_LOCATION = (
+    '{"uri":%s,"range":{"start":{"line":%d,"character":%d},'
+    '"end":{"line":%d,"character":%d}}}'
+)
+
+
+class StaticCompletionItem(lsp.CompletionItem):
+    """
+    A completion item that never changes once created.
+
+    Static items are encoded to JSON the first time they're sent and the result is
+    reused by every later completion response, rather than converting them again.
+    """
+
+    __slots__ = ("_encoded",)
+    _encoded: str
+
+    def encode(self, converter: cattrs.Converter) -> str:
+        """Return the item encoded as JSON, encoding it on first use."""
+        try:
+            return self._encoded
+        except AttributeError:
+            self._encoded = json.dumps(
+                converter.unstructure(self, unstructure_as=lsp.CompletionItem)
+            )
+            return self._encoded
+
+
+def _encode_semantic_tokens(tokens: lsp.SemanticTokens) -> str | None:
+    if tokens.result_id is not None:
+        return None
+
+    # Encodings are stored as arrays, which convert to lists in a single copy
+    data = tokens.data
+    return '{"data":%s}' % json.dumps(
+        data.tolist() if hasattr(data, "tolist") else list(data)
+    )
+
+
+def _encode_completion_list(
+    completions: lsp.CompletionList, converter: cattrs.Converter
+) -> str | None:
+    if completions.item_defaults is not None:
+        return None
+
+    items = ",".join(
+        item.encode(converter)
+        if isinstance(item, StaticCompletionItem)
+        else json.dumps(converter.unstructure(item, unstructure_as=lsp.CompletionItem))
+        for item in completions.items
+    )
+    return (
+        f'{{"isIncomplete":{json.dumps(completions.is_incomplete)},"items":[{items}]}}'
+    )
+
+
+def _encode_locations(locations: list) -> str | None:
+    if not all(type(location) is lsp.Location for location in locations):
+        return None
+
+    uris: dict[str, str] = {}
+    encoded = []
+    for location in locations:
+        if (uri := uris.get(location.uri)) is None:
+            uri = uris[location.uri] = json.dumps(location.uri)
+        start, end = location.range.start, location.range.end
+        encoded.append(
+            _LOCATION % (uri, start.line, start.character, end.line, end.character)
+        )
+
+    return "[%s]" % ",".join(encoded)
+
+
+def encode_result(result: Any, converter: cattrs.Converter) -> str | None:
+    """
+    Encode a request result as JSON if it has a fast path.
+
+    Semantic tokens, completion lists, and locations are written directly as JSON
+    rather than being converted to dictionaries first. Other results, and variations
+    that the fast paths don't handle, return None.
+    """
+    if isinstance(result, lsp.SemanticTokens):
+        return _encode_semantic_tokens(result)
+    if isinstance(result, lsp.CompletionList):
+        return _encode_completion_list(result, converter)
+    if isinstance(result, list) and result:
+        return _encode_locations(result)
+    return None
+
+
+def encode_response(message: Any, converter: cattrs.Converter) -> str | None:
+    """Encode a successful response as JSON if its result has a fast path."""
+    if not hasattr(message, "result") or not hasattr(message, "id"):
+        return None
+    if (result := encode_result(message.result, converter)) is None:
+        return None
+
+    msg_id, jsonrpc = json.dumps(message.id), json.dumps(message.jsonrpc)
+    return f'{{"id":{msg_id},"jsonrpc":{jsonrpc},"result":{result}}}'
+
+
+class FastSerializationProtocol(LanguageServerProtocol):
+    """A protocol that sends the largest responses through a fast path."""
+
+    def _send_data(self, data: Any) -> None:
+        if not data or self.transport is None:
+            super()._send_data(data)
+            return
+
+        try:
+            body = encode_response(data, self._converter)
+            if body is None:
+                super()._send_data(data)
+                return
+
+            logger.info("Sending data: %s", body)
+            if self._send_only_body:
+                self.transport.write(body)  # type: ignore
+                return
+
+            encoded = body.encode(self.CHARSET)
+            header = (
+                f"Content-Length: {len(encoded)}\r\n"
+                f"Content-Type: {self.CONTENT_TYPE}; charset={self.CHARSET}\r\n\r\n"
+            ).encode(self.CHARSET)
+            self.transport.write(header + encoded)
+        except Exception as error:
+            logger.exception("Error sending data", exc_info=True)
+            self._server._report_server_error(error, JsonRpcInternalError)
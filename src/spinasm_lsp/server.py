@@ -2,95 +2,555 @@
 
 from __future__ import annotations
 
-from functools import lru_cache
-from typing import Any
+import argparse
+import asyncio
+import dataclasses
+import functools
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Sequence, TypeVar
 
 from lsprotocol import types as lsp
 from pygls.server import LanguageServer
+from pygls.uris import to_fs_path
+from pygls.workspace import Workspace
 
 from spinasm_lsp import __version__
 from spinasm_lsp.docs import MULTI_WORD_INSTRUCTIONS, DocumentationManager
-from spinasm_lsp.parser import SPINAsmParser
+from spinasm_lsp.documents import DocumentActor
+from spinasm_lsp.ingest import read_source
+from spinasm_lsp.logs import MessageLog
+from spinasm_lsp.memory import deep_sizeof
+from spinasm_lsp.parser import DEFAULT_PARSE_LIMITS, SCAN_CACHE, SPINAsmParser
+from spinasm_lsp.recording import Recorder
+from spinasm_lsp.scheduler import Priority, Scheduler
+from spinasm_lsp.serialization import FastSerializationProtocol, StaticCompletionItem
+from spinasm_lsp.sessions import (
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_HOST,
+    DEFAULT_PORT,
+    ParseCache,
+    SessionProtocol,
+    serve_tcp,
+    serve_ws,
+)
 from spinasm_lsp.tokens import SEMANTIC_MODIFIER_LEGEND, SEMANTIC_TYPE_LEGEND
 
+_F = TypeVar("_F", bound=Callable)
+
+PATCH_SUFFIXES = (".spn",)
+
+# Initialization options for each parsing limit
+PARSE_LIMIT_OPTIONS = {
+    "maxDocumentBytes": "max_bytes",
+    "maxDocumentTokens": "max_tokens",
+    "parseTimeBudget": "time_budget",
+}
+
+
+def _find_patches(folders: Sequence[str]) -> list[Path]:
+    """Find all patch files within a set of folder URIs."""
+    patches: set[Path] = set()
+    for uri in folders:
+        if (path := to_fs_path(uri)) is None or not Path(path).is_dir():
+            continue
+
+        patches.update(
+            p
+            for p in Path(path).rglob("*")
+            if p.suffix.lower() in PATCH_SUFFIXES and p.is_file()
+        )
 
-@lru_cache(maxsize=1)
-def _parse_document(source: str) -> SPINAsmParser:
-    """
-    Parse a document and return the parser.
+    return sorted(patches)
 
-    Parser are cached based on the source code to speed up subsequent parsing.
-    """
-    return SPINAsmParser(source)
+
+def _hash_diagnostics(diagnostics: Sequence[lsp.Diagnostic]) -> int:
+    """Hash the ranges, messages, and severities of a sequence of diagnostics."""
+    return hash(
+        tuple(
+            (
+                d.range.start.line,
+                d.range.start.character,
+                d.range.end.line,
+                d.range.end.character,
+                d.message,
+                d.severity,
+            )
+            for d in diagnostics
+        )
+    )
 
 
 class SPINAsmLanguageServer(LanguageServer):
-    def __init__(self, *args, **kwargs) -> None:
-        self._prev_parser: SPINAsmParser | None = None
+    def __init__(self, *args, parse_cache: ParseCache | None = None, **kwargs) -> None:
+        self._documents: dict[str, DocumentActor] = {}
+        self._signatures: dict[str, lsp.SignatureInformation | None] = {}
+        self._published_diagnostics: dict[str, int] = {}
+        self._registered_features: list[tuple[str, Any, Callable]] = []
+        self._registered_commands: list[tuple[str, Callable]] = []
+        self.position_encoding = lsp.PositionEncodingKind.Utf16
         self.documentation = DocumentationManager()
 
+        self.parse_cache = parse_cache
+        """Parsers shared by source between sessions or with pre-warming."""
+        self._cache_entries: dict[str, tuple[str, SPINAsmParser]] = {}
+
+        self.recorder: Recorder | None = None
+        """Records messages exchanged with clients, if enabled."""
+
+        self.parse_limits = DEFAULT_PARSE_LIMITS
+        """Limits above which documents are only scanned for highlighting."""
+
+        self.prewarm = False
+        """Whether to parse all patches in the workspace once initialized."""
+        self._prewarm_task: asyncio.Task | None = None
+
+        kwargs.setdefault("protocol_cls", FastSerializationProtocol)
         super().__init__(*args, name="spinasm-lsp", version=__version__, **kwargs)
 
-    def debug(self, msg: Any) -> None:
-        """Log a debug message."""
+        self.messages = MessageLog(self)
+        """Messages logged to the client's output channel."""
+
+    def feature(self, feature_name: str, options: Any = None) -> Callable[[_F], _F]:
+        """Register an LSP feature, recording it for future sessions."""
+        register = super().feature(feature_name, options)
+
+        def decorator(f: _F) -> _F:
+            self._registered_features.append((feature_name, options, f))
+            return register(f)
+
+        return decorator
+
+    def command(self, command_name: str) -> Callable[[_F], _F]:
+        """Register a custom command, recording it for future sessions."""
+        register = super().command(command_name)
+
+        def decorator(f: _F) -> _F:
+            self._registered_commands.append((command_name, f))
+            return register(f)
+
+        return decorator
+
+    def new_session(self) -> SPINAsmLanguageServer:
+        """
+        Create a server for a new client that shares workers and caches with this one.
+
+        Each session has its own workspace and open documents, but parsers for
+        identical sources are shared through the parse cache.
+        """
+        session = SPINAsmLanguageServer(
+            loop=self.loop,
+            protocol_cls=SessionProtocol,
+            max_workers=self._max_workers,
+            parse_cache=self.parse_cache,
+        )
+        session.documentation = self.documentation
+        session._signatures = self._signatures
+        session.static_completions = self.static_completions
+        session.scheduler = self.scheduler
+
+        for feature_name, options, f in self._registered_features:
+            session.feature(feature_name, options)(f)
+        for command_name, f in self._registered_commands:
+            session.command(command_name)(f)
+
+        if self.recorder is not None:
+            self.recorder.attach(session.lsp)
+
+        return session
+
+    def shutdown(self) -> None:
+        """Release cached state for all documents and shut down the server."""
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+        for uri in list(self._documents):
+            self.evict(uri)
+
+        super().shutdown()
+
+    def debug(self, msg: Any, *args: Any) -> None:
+        """Log a debug message, formatted with any arguments if it will be sent."""
         # MessageType.Debug is a proposed feature of 3.18.0, and isn't fully supported
         # yet.
-        self.show_message_log(str(msg), lsp.MessageType.Log)
+        self.messages.log(lsp.MessageType.Log, msg, *args)
+
+    def info(self, msg: Any, *args: Any) -> None:
+        """Log an info message, formatted with any arguments if it will be sent."""
+        self.messages.log(lsp.MessageType.Info, msg, *args)
+
+    def warning(self, msg: Any, *args: Any) -> None:
+        """Log a warning message, formatted with any arguments if it will be sent."""
+        self.messages.log(lsp.MessageType.Warning, msg, *args)
+
+    def error(self, msg: Any, *args: Any) -> None:
+        """Log an error message, formatted with any arguments if it will be sent."""
+        self.messages.log(lsp.MessageType.Error, msg, *args)
+
+    def negotiate_position_encoding(self, capabilities: lsp.ClientCapabilities) -> None:
+        """
+        Select the position encoding used for positions sent to and from the client.
+
+        UTF-32 matches the string indices used by the parser, so it is preferred when
+        the client supports it. Otherwise, fall back to UTF-16, which all clients
+        support.
+        """
+        general = capabilities.general
+        encodings = (general.position_encodings if general else None) or []
+
+        self.position_encoding = (
+            lsp.PositionEncodingKind.Utf32
+            if lsp.PositionEncodingKind.Utf32 in encodings
+            else lsp.PositionEncodingKind.Utf16
+        )
 
-    def info(self, msg: Any) -> None:
-        """Log an info message."""
-        self.show_message_log(str(msg), lsp.MessageType.Info)
+        if self.lsp.server_capabilities.position_encoding == self.position_encoding:
+            return
 
-    def warning(self, msg: Any) -> None:
-        """Log a warning message."""
-        self.show_message_log(str(msg), lsp.MessageType.Warning)
+        # Rebuild the workspace so that document edits are applied in the same encoding
+        self.lsp.server_capabilities.position_encoding = self.position_encoding
+        self.lsp._workspace = Workspace(
+            self.workspace.root_uri,
+            self._text_document_sync_kind,
+            list(self.workspace.folders.values()),
+            self.position_encoding,
+        )
+        for uri in list(self._documents):
+            self.evict(uri)
+
+    def get_signature(self, opcode_name: str) -> lsp.SignatureInformation | None:
+        """Return the signature of an opcode, caching it for future requests."""
+        key = opcode_name.upper()
+        if key not in self._signatures:
+            opcode = self.documentation.get_instruction(key)
+            self._signatures[key] = (
+                None
+                if opcode is None
+                else lsp.SignatureInformation(
+                    label=f"{opcode.name} {opcode.args.markdown}",
+                    parameters=[
+                        lsp.ParameterInformation(label=arg.markdown)
+                        for arg in opcode.args
+                    ],
+                    documentation=lsp.MarkupContent(
+                        kind=lsp.MarkupKind.Markdown,
+                        value=opcode.markdown,
+                    ),
+                )
+            )
 
-    def error(self, msg: Any) -> None:
-        """Log an error message."""
-        self.show_message_log(str(msg), lsp.MessageType.Error)
+        return self._signatures[key]
+
+    @functools.cached_property
+    def static_completions(self) -> list[StaticCompletionItem]:
+        """Completion items for every opcode and assembler directive."""
+        # TODO: If possible, get this from the completion item itself. This will require
+        # tokens to be able to query documentation.
+        opcode_completions = [
+            StaticCompletionItem(
+                label=opcode,
+                kind=lsp.CompletionItemKind.Function,
+                detail="(opcode)",
+                documentation=lsp.MarkupContent(
+                    kind=lsp.MarkupKind.Markdown,
+                    value=self.documentation.get_markdown(opcode),
+                ),
+            )
+            for opcode in [k.upper() for k in self.documentation.instructions]
+        ]
 
-    async def get_parser(self, uri: str) -> SPINAsmParser:
-        """Return a parser for the document, caching if possible."""
-        document = self.workspace.get_text_document(uri)
-        parser = _parse_document(document.source)
+        assembler_completions = [
+            StaticCompletionItem(
+                label=assembler,
+                kind=lsp.CompletionItemKind.Operator,
+                detail="(assembler)",
+                documentation=lsp.MarkupContent(
+                    kind=lsp.MarkupKind.Markdown,
+                    value=self.documentation.get_markdown(assembler),
+                ),
+            )
+            for assembler in [k.upper() for k in self.documentation.assemblers]
+        ]
+
+        return opcode_completions + assembler_completions
+
+    @functools.cached_property
+    def scheduler(self) -> Scheduler:
+        """A scheduler for running work in the thread pool by priority."""
+        return Scheduler(self.thread_pool_executor)
+
+    def get_document(self, uri: str) -> DocumentActor:
+        """Return the actor that coordinates parsing for the document."""
+        if (actor := self._documents.get(uri)) is None:
+            actor = DocumentActor(
+                parse=self._parse,
+                on_update=lambda parser: self._document_updated(uri, parser),
+                on_error=self.error,
+            )
+            self._documents[uri] = actor
+
+        return actor
+
+    def _document_updated(self, uri: str, parser: SPINAsmParser) -> None:
+        """Publish diagnostics and release the cached parse of the previous version."""
+        self._publish_if_changed(uri, parser.diagnostics)
+
+        actor = self._documents.get(uri)
+        if self.parse_cache is None or actor is None or actor.snapshot is None:
+            return
+
+        # Comment-only edits reuse the parser, which stays cached under the source it
+        # was parsed from
+        previous = self._cache_entries.get(uri)
+        if previous is not None and previous[1] is parser:
+            return
+
+        # Only the current version of an open document is kept in the cache
+        key = ParseCache.key(
+            actor.snapshot.source, self.position_encoding, self.parse_limits
+        )
+        if previous is not None and previous[0] != key:
+            self.parse_cache.discard(previous[0])
+        self._cache_entries[uri] = (key, parser)
+
+    async def _parse(
+        self, source: str, priority: Priority, cancelled: threading.Event
+    ) -> SPINAsmParser:
+        """Parse a source in the thread pool."""
+        # Pre-warming may create the cache while this parse is running
+        cache = self.parse_cache
+        if cache is not None:
+            key = ParseCache.key(source, self.position_encoding, self.parse_limits)
+            if (parser := cache.get(key)) is not None:
+                return parser
+
+        # Parse in a worker thread so that the event loop can still receive
+        # cancellations and schedule other requests while a large document is parsed.
+        try:
+            parser = await self.scheduler.run(
+                priority,
+                SPINAsmParser,
+                source,
+                position_encoding=self.position_encoding,
+                cancelled=cancelled,
+                limits=self.parse_limits,
+            )
+        except asyncio.CancelledError:
+            # Nothing is waiting for the parse anymore, so stop at the next checkpoint
+            cancelled.set()
+            raise
 
-        # Skip publishing diagnostics if the parser is unchanged
-        if parser is not self._prev_parser:
-            self.publish_diagnostics(document.uri, parser.diagnostics)
-            self._prev_parser = parser
+        # Running out of time depends on the load, so another parse may not
+        if cache is not None and parser.degraded_limit != "time_budget":
+            cache.put(key, parser)
 
         return parser
 
+    def start_prewarm(self) -> None:
+        """Start parsing all patches in the workspace in the background."""
+        self._prewarm_task = asyncio.ensure_future(self.prewarm_workspace())
+
+    async def prewarm_workspace(self) -> None:
+        """
+        Parse all patches in the workspace folders at background priority.
+
+        Parsers are stored in the parse cache, so that opening a patch later doesn't
+        need to wait on parsing. Progress is reported if the client supports it.
+        """
+        folders = [folder.uri for folder in self.workspace.folders.values()]
+        if not folders and self.workspace.root_uri:
+            folders = [self.workspace.root_uri]
+
+        paths = await self.scheduler.run(Priority.BACKGROUND, _find_patches, folders)
+        if self.parse_cache is None:
+            self.parse_cache = ParseCache(max_size=max(DEFAULT_CACHE_SIZE, len(paths)))
+
+        token = await self._begin_progress("Parsing SPINAsm patches")
+        cancelled = threading.Event()
+        parsed = 0
+        try:
+            for i, path in enumerate(paths):
+                self._report_progress(token, path.name, i, len(paths))
+                try:
+                    source = await self.scheduler.run(
+                        Priority.BACKGROUND, read_source, path
+                    )
+                    await self._parse(source, Priority.BACKGROUND, cancelled)
+                except OSError as e:
+                    self.warning("Failed to read %s: %s", path, e)
+                    continue
+                except Exception as e:
+                    self.error("Failed to parse %s: %s", path, e)
+                    continue
+                parsed += 1
+        finally:
+            self._end_progress(token, f"Parsed {parsed} of {len(paths)} patches")
+
+    async def _begin_progress(self, title: str) -> str | None:
+        """Begin reporting progress, if the client supports it."""
+        window = self.client_capabilities.window
+        if window is None or not window.work_done_progress:
+            return None
+
+        token = str(uuid.uuid4())
+        await self.progress.create_async(token)
+        self.progress.begin(token, lsp.WorkDoneProgressBegin(title=title, percentage=0))
+        return token
+
+    def _report_progress(
+        self, token: str | None, message: str, done: int, total: int
+    ) -> None:
+        """Report progress, if it was started."""
+        if token is not None:
+            self.progress.report(
+                token,
+                lsp.WorkDoneProgressReport(
+                    message=message, percentage=done * 100 // max(total, 1)
+                ),
+            )
+
+    def _end_progress(self, token: str | None, message: str) -> None:
+        """End progress, if it was started."""
+        if token is not None:
+            self.progress.end(token, lsp.WorkDoneProgressEnd(message=message))
+
+    async def get_parser(
+        self, uri: str, priority: Priority = Priority.INTERACTIVE
+    ) -> SPINAsmParser:
+        """
+        Return a parser for the current version of the document, caching if possible.
+
+        If the document needs to be parsed, parsing is scheduled with the given
+        priority. Diagnostics are published whenever a newer version is parsed.
+        """
+        document = self.workspace.get_text_document(uri)
+        return await self.get_document(uri).get(
+            document.source, document.version, priority
+        )
+
+    def schedule_parse(self, uri: str) -> None:
+        """Schedule parsing the current version of the document to run diagnostics."""
+        document = self.workspace.get_text_document(uri)
+        self.get_document(uri).update(
+            document.source, document.version, Priority.DIAGNOSTICS
+        )
+
+    def evict(self, uri: str) -> None:
+        """Release all cached state for the document."""
+        if (actor := self._documents.pop(uri, None)) is not None:
+            actor.close()
+        cached = self._cache_entries.pop(uri, None)
+        if cached is not None and self.parse_cache is not None:
+            self.parse_cache.discard(cached[0])
+
+    def memory_report(self) -> dict[str, dict[str, int]]:
+        """Report the estimated memory held by each cached document, in bytes."""
+        return {
+            uri: {
+                "source": deep_sizeof(actor.snapshot.source),
+                "parser": deep_sizeof(actor.snapshot.parser),
+                "tokens": sum(1 for _ in actor.snapshot.parser.evaluated_tokens),
+            }
+            for uri, actor in self._documents.items()
+            if actor.snapshot is not None
+        }
+
+    def _publish_if_changed(
+        self, uri: str, diagnostics: Sequence[lsp.Diagnostic]
+    ) -> None:
+        """Publish diagnostics unless they match the last diagnostics for the URI."""
+        diagnostics_hash = _hash_diagnostics(diagnostics)
+        if self._published_diagnostics.get(uri) == diagnostics_hash:
+            return
+
+        self.publish_diagnostics(uri, list(diagnostics))
+        self._published_diagnostics[uri] = diagnostics_hash
+
+    def clear_diagnostics(self, uri: str) -> None:
+        """Clear the published diagnostics for the document."""
+        self.publish_diagnostics(uri, [])
+        self._published_diagnostics.pop(uri, None)
+
 
 server = SPINAsmLanguageServer(max_workers=5)
 
 
+@server.feature(lsp.INITIALIZE)
+def initialize(ls: SPINAsmLanguageServer, params: lsp.InitializeParams) -> None:
+    """Negotiate the position encoding and read the initialization options."""
+    ls.negotiate_position_encoding(params.capabilities)
+
+    # Honor the client's initial trace value, which pygls resets when initializing
+    if params.trace is not None:
+        ls.lsp.trace = params.trace
+
+    options = params.initialization_options
+    if isinstance(options, dict):
+        ls.prewarm = bool(options.get("prewarmWorkspace", False))
+        if isinstance(log_level := options.get("logLevel"), str):
+            ls.messages.set_level(log_level)
+
+        # Each limit is set by a number or disabled by null
+        limits: dict[str, Any] = {
+            field: value
+            for name, field in PARSE_LIMIT_OPTIONS.items()
+            if name in options
+            and (
+                (value := options[name]) is None
+                or isinstance(value, (int, float))
+                and not isinstance(value, bool)
+            )
+        }
+        ls.parse_limits = dataclasses.replace(ls.parse_limits, **limits)
+
+
+@server.feature(lsp.INITIALIZED)
+def initialized(ls: SPINAsmLanguageServer, params: lsp.InitializedParams) -> None:
+    """Start pre-warming the workspace, if requested."""
+    if ls.prewarm:
+        ls.start_prewarm()
+
+
 @server.feature(lsp.TEXT_DOCUMENT_DID_CHANGE)
-async def did_change(
+def did_change(
     ls: SPINAsmLanguageServer, params: lsp.DidChangeTextDocumentParams
-):
+) -> None:
     """Run diagnostics on changed document."""
-    await ls.get_parser(params.text_document.uri)
+    ls.schedule_parse(params.text_document.uri)
 
 
 @server.feature(lsp.TEXT_DOCUMENT_DID_SAVE)
-async def did_save(ls: SPINAsmLanguageServer, params: lsp.DidSaveTextDocumentParams):
+def did_save(ls: SPINAsmLanguageServer, params: lsp.DidSaveTextDocumentParams) -> None:
     """Run diagnostics on saved document."""
-    await ls.get_parser(params.text_document.uri)
+    ls.schedule_parse(params.text_document.uri)
 
 
 @server.feature(lsp.TEXT_DOCUMENT_DID_OPEN)
-async def did_open(ls: SPINAsmLanguageServer, params: lsp.DidOpenTextDocumentParams):
+def did_open(ls: SPINAsmLanguageServer, params: lsp.DidOpenTextDocumentParams) -> None:
     """Run diagnostics on open document."""
-    await ls.get_parser(params.text_document.uri)
+    ls.schedule_parse(params.text_document.uri)
 
 
 @server.feature(lsp.TEXT_DOCUMENT_DID_CLOSE)
 def did_close(
     ls: SPINAsmLanguageServer, params: lsp.DidCloseTextDocumentParams
 ) -> None:
-    """Clear the diagnostics on close."""
-    ls.publish_diagnostics(params.text_document.uri, [])
+    """Clear the diagnostics and release cached state on close."""
+    ls.clear_diagnostics(params.text_document.uri)
+    ls.evict(params.text_document.uri)
+
+
+@server.command("spinasm.memoryReport")
+def memory_report(ls: SPINAsmLanguageServer, *args) -> dict[str, dict[str, int]]:
+    """Report the estimated memory held for each cached document."""
+    report = ls.memory_report()
+    ls.debug(report)
+    ls.debug(
+        "Scan cache: %d lines, %.1f%% hit rate",
+        len(SCAN_CACHE),
+        SCAN_CACHE.hit_rate * 100,
+    )
+    return report
 
 
 @server.feature(lsp.TEXT_DOCUMENT_HOVER)
@@ -144,37 +604,9 @@ async def completions(
             symbol_completions.append(token.completion_item)
             seen_tokens.add(token.stxt)
 
-    # TODO: If possible, get this from the completion item itself. This will require
-    # tokens to be able to query documentation.
-    opcode_completions = [
-        lsp.CompletionItem(
-            label=opcode,
-            kind=lsp.CompletionItemKind.Function,
-            detail="(opcode)",
-            documentation=lsp.MarkupContent(
-                kind=lsp.MarkupKind.Markdown,
-                value=ls.documentation.get_markdown(opcode),
-            ),
-        )
-        for opcode in [k.upper() for k in ls.documentation.instructions]
-    ]
-
-    assembler_completions = [
-        lsp.CompletionItem(
-            label=assembler,
-            kind=lsp.CompletionItemKind.Operator,
-            detail="(assembler)",
-            documentation=lsp.MarkupContent(
-                kind=lsp.MarkupKind.Markdown,
-                value=ls.documentation.get_markdown(assembler),
-            ),
-        )
-        for assembler in [k.upper() for k in ls.documentation.assemblers]
-    ]
-
     return lsp.CompletionList(
         is_incomplete=False,
-        items=symbol_completions + opcode_completions + assembler_completions,
+        items=[*symbol_completions, *ls.static_completions],
     )
 
 
@@ -205,7 +637,7 @@ async def document_symbol_definitions(
 ) -> list[lsp.DocumentSymbol]:
     """Returns the definition location of all symbols in the document."""
     parser = await ls.get_parser(params.text_document.uri)
-    return [t.document_symbol for t in parser.evaluated_tokens if t.defined]
+    return list(parser.document_symbols)
 
 
 @server.feature(lsp.TEXT_DOCUMENT_PREPARE_RENAME)
@@ -218,11 +650,12 @@ async def prepare_rename(ls: SPINAsmLanguageServer, params: lsp.PrepareRenamePar
         return None
 
     # Renaming is checked against the base token name, ignoring address modifiers.
-    base_token = token.without_address_modifier()
+    references = parser.symbol_references.get(token.stxt)
 
     # Only user-defined labels should support renaming
-    if not base_token.defined:
-        ls.info(f"Can't rename non-user defined token {base_token.stxt}.")
+    if references is None or not references.defined:
+        name = token.stxt if references is None else references.name
+        ls.info("Can't rename non-user defined token %s.", name)
         return None
 
     return lsp.PrepareRenameResult_Type2(default_behavior=True)
@@ -240,10 +673,10 @@ async def rename(
         return None
 
     # Ignore address modifiers so that e.g. we can rename `Delay` by renaming `Delay#`
-    base_token = token.without_address_modifier()
-    matching_tokens = parser.evaluated_tokens.get(name=base_token.stxt)
+    references = parser.symbol_references.get(token.stxt)
+    ranges = [] if references is None else references.ranges
 
-    edits = [lsp.TextEdit(t.range, new_text=params.new_name) for t in matching_tokens]
+    edits = [lsp.TextEdit(r, new_text=params.new_name) for r in ranges]
     return lsp.WorkspaceEdit(changes={params.text_document.uri: edits})
 
 
@@ -258,12 +691,35 @@ async def references(
 
     # Ignore address modifiers so that e.g. we can find all variations of addresses,
     # e.g. `Delay` and `Delay#`
-    base_token = token.without_address_modifier()
-    matching_tokens = parser.evaluated_tokens.get(name=base_token.stxt)
+    if (references := parser.symbol_references.get(token.stxt)) is None:
+        return []
+
+    return [
+        lsp.Location(uri=params.text_document.uri, range=r) for r in references.ranges
+    ]
+
+
+@server.feature(lsp.TEXT_DOCUMENT_DOCUMENT_HIGHLIGHT)
+async def document_highlight(
+    ls: SPINAsmLanguageServer, params: lsp.DocumentHighlightParams
+) -> list[lsp.DocumentHighlight]:
+    """Highlight all occurrences of the symbol under the cursor."""
+    parser = await ls.get_parser(params.text_document.uri)
+
+    if (token := parser.evaluated_tokens.get(position=params.position)) is None:
+        return []
+
+    if (references := parser.symbol_references.get(token.stxt)) is None:
+        return []
 
     return [
-        lsp.Location(uri=params.text_document.uri, range=t.range)
-        for t in matching_tokens
+        lsp.DocumentHighlight(
+            range=full_range,
+            kind=lsp.DocumentHighlightKind.Write
+            if base_range == references.defined
+            else lsp.DocumentHighlightKind.Read,
+        )
+        for base_range, full_range in zip(references.ranges, references.full_ranges)
     ]
 
 
@@ -278,54 +734,31 @@ async def signature_help(
 
     # Find all opcodes on the line that could have triggered the signature help. Ignore
     # opcodes that appear after the cursor, to avoid showing signature help prematurely.
-    line_tokens = parser.evaluated_tokens.get(line=params.position.line)
     opcodes = [
-        t
-        for t in line_tokens
-        if t.is_opcode and t.range.end.character < params.position.character
+        args
+        for args in parser.opcode_arguments.get(params.position.line, [])
+        if args.opcode.range.end.character < params.position.character
     ]
     if not opcodes:
         return None
 
     # We should never have more than one opcode on a line, but just in case, grab the
     # last one entered before the cursor.
-    triggered_opcode = opcodes[-1]
-    opcode = ls.documentation.get_instruction(triggered_opcode.stxt)
-    if opcode is None:
+    triggered = opcodes[-1]
+    if (signature := ls.get_signature(triggered.opcode.stxt)) is None:
         return None
 
-    # Get all argument separators after the opcode
-    remaining_tokens = line_tokens[line_tokens.index(triggered_opcode) + 1 :]
-    argseps = [t for t in remaining_tokens if t.type == "ARGSEP"]
-
-    # The first argument of multi-word instructions like CHO RDAL is treated as part of
-    # the opcode, so we should skip the first separator when counting arguments.
-    if triggered_opcode.stxt in MULTI_WORD_INSTRUCTIONS:
-        argseps = argseps[1:]
-
     # Count how many parameters are left of the cursor to see which argument we're
     # currently entering.
-    arg_idx = len(
-        [
-            argsep
-            for argsep in argseps
-            if params.position.character > argsep.range.start.character
-        ]
-    )
+    arg_idx = triggered.active_parameter(params.position.character)
 
-    signature = [lsp.ParameterInformation(label=arg.markdown) for arg in opcode.args]
+    # The first argument of multi-word instructions like CHO RDAL is treated as part of
+    # the opcode, so we should skip the first separator when counting arguments.
+    if triggered.opcode.stxt in MULTI_WORD_INSTRUCTIONS:
+        arg_idx = max(arg_idx - 1, 0)
 
     return lsp.SignatureHelp(
-        signatures=[
-            lsp.SignatureInformation(
-                label=f"{opcode.name} {opcode.args.markdown}",
-                parameters=signature,
-                documentation=lsp.MarkupContent(
-                    kind=lsp.MarkupKind.Markdown,
-                    value=opcode.markdown,
-                ),
-            )
-        ],
+        signatures=[signature],
         active_signature=0,
         active_parameter=arg_idx,
     )
@@ -342,11 +775,60 @@ async def semantic_tokens(
     ls: SPINAsmLanguageServer, params: lsp.SemanticTokensParams
 ) -> lsp.SemanticTokens:
     parser = await ls.get_parser(params.text_document.uri)
-    return lsp.SemanticTokens(data=parser.semantic_encoding)
-
-
-def start() -> None:
-    server.start_io()
+    # The encoding is a read-only view of the parser's array, which is written to the
+    # response directly.
+    return lsp.SemanticTokens(data=parser.semantic_encoding)  # type: ignore[arg-type]
+
+
+def _serve(serve: Callable, host: str, port: int) -> None:
+    """Serve a separate session to each client that connects, until interrupted."""
+    server.parse_cache = ParseCache()
+    listener = server.loop.run_until_complete(serve(server.new_session, host, port))
+    server.info("Serving on %s:%d", host, port)
+    try:
+        server.loop.run_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        listener.close()
+        server.shutdown()
+
+
+def start(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="spinasm-lsp", description=__doc__)
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument(
+        "--tcp", action="store_true", help="Serve multiple clients over TCP."
+    )
+    transport.add_argument(
+        "--ws", action="store_true", help="Serve multiple clients over WebSocket."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help="The host to bind to.")
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="The port to bind to."
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="Record messages exchanged with clients to a JSON lines file.",
+    )
+    args = parser.parse_args(argv)
+
+    if args.record:
+        server.recorder = Recorder(args.record)
+
+    try:
+        if args.tcp:
+            _serve(serve_tcp, args.host, args.port)
+        elif args.ws:
+            _serve(serve_ws, args.host, args.port)
+        else:
+            if server.recorder is not None:
+                server.recorder.attach(server.lsp)
+            server.start_io()
+    finally:
+        if server.recorder is not None:
+            server.recorder.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+"""Serving multiple clients from a single server process."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable
+
+from lsprotocol import types as lsp
+from pygls.protocol import lsp_method
+from pygls.server import LanguageServer
+
+from spinasm_lsp.parser import ParseLimits, SPINAsmParser
+from spinasm_lsp.serialization import FastSerializationProtocol
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 2087
+DEFAULT_CACHE_SIZE = 128
+
+SessionFactory = Callable[[], LanguageServer]
+
+
+class ParseCache:
+    """
+    A bounded cache of finished parsers, keyed by a hash of their source.
+
+    Finished parsers are immutable, so a single parser can be shared by every session
+    that opens identical source. The least recently used parsers are dropped once the
+    cache is full.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of parsers to keep.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._parsers: OrderedDict[str, SPINAsmParser] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._parsers)
+
+    @staticmethod
+    def key(
+        source: str,
+        position_encoding: lsp.PositionEncodingKind,
+        limits: ParseLimits | None = None,
+    ) -> str:
+        """Return the cache key for a source parsed with an encoding and limits."""
+        digest = hashlib.sha256(source.encode("utf-8", errors="surrogatepass"))
+        if limits is not None:
+            digest.update(repr(limits).encode())
+        return f"{position_encoding.value}:{digest.hexdigest()}"
+
+    def get(self, key: str) -> SPINAsmParser | None:
+        """Return the cached parser for a key, if any."""
+        if (parser := self._parsers.get(key)) is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._parsers.move_to_end(key)
+        return parser
+
+    def discard(self, key: str) -> None:
+        """Drop the cached parser for a key, if any."""
+        self._parsers.pop(key, None)
+
+    def put(self, key: str, parser: SPINAsmParser) -> None:
+        """Cache a parser, dropping the least recently used parsers if needed."""
+        self._parsers[key] = parser
+        self._parsers.move_to_end(key)
+        while len(self._parsers) > self.max_size:
+            self._parsers.popitem(last=False)
+
+
+class SessionProtocol(FastSerializationProtocol):
+    """
+    The protocol for one of several clients sharing a server process.
+
+    By default, a language server exits the process when its client disconnects or
+    sends `exit`. Sessions shut down their own server instead, leaving other sessions
+    running.
+    """
+
+    @lsp_method(lsp.EXIT)
+    def lsp_exit(self, *args) -> None:
+        """Close the connection to the client without stopping the process."""
+        if self.transport is not None:
+            self.transport.close()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        """Release the session once the client disconnects."""
+        self._server.shutdown()
+
+
+class _WebSocketTransport:
+    """Adapt a WebSocket connection to the transport interface used by the protocol."""
+
+    def __init__(self, websocket: Any):
+        self._websocket = websocket
+
+    def close(self) -> None:
+        asyncio.ensure_future(self._websocket.close())
+
+    def write(self, data: Any) -> None:
+        asyncio.ensure_future(self._websocket.send(data))
+
+
+async def serve_tcp(
+    new_session: SessionFactory, host: str, port: int
+) -> asyncio.Server:
+    """Start serving a new session to each client that connects over TCP."""
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(lambda: new_session().lsp, host, port)
+
+
+async def serve_ws(new_session: SessionFactory, host: str, port: int) -> Any:
+    """Start serving a new session to each client that connects over WebSocket."""
+    try:
+        from websockets.server import serve  # type: ignore[import-not-found]
+    except ImportError as e:
+        raise ImportError(
+            "Serving over WebSocket requires `websockets`. Run "
+            "`pip install pygls[ws]` to install it."
+        ) from e
+
+    async def handle_connection(websocket: Any, *args: Any) -> None:
+        protocol = new_session().lsp
+        protocol._send_only_body = True
+        protocol.connection_made(_WebSocketTransport(websocket))  # type: ignore
+        try:
+            async for message in websocket:
+                protocol._procedure_handler(
+                    json.loads(message, object_hook=protocol._deserialize_message)
+                )
+        finally:
+            protocol.connection_lost(None)
+
+    return await serve(handle_connection, host, port)
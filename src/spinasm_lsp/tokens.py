@@ -4,11 +4,27 @@ from __future__ import annotations
 
 import bisect
 import copy
+import functools
+import itertools
+from array import array
 from dataclasses import dataclass
-from typing import Generator, Generic, Literal, TypeVar, overload
+from types import MappingProxyType
+from typing import (
+    Generator,
+    Generic,
+    Iterable,
+    Literal,
+    Mapping,
+    NamedTuple,
+    Sequence,
+    TypeVar,
+    overload,
+)
 
 import lsprotocol.types as lsp
 
+from spinasm_lsp.lines import LineMap
+
 _ParsedTokenT = TypeVar("_ParsedTokenT", bound="ParsedToken")
 _EvaluatedTokenT = TypeVar("_EvaluatedTokenT", bound="EvaluatedToken")
 
@@ -29,6 +45,67 @@ TokenType = Literal[
 SEMANTIC_TYPE_LEGEND = {k: i for i, k in enumerate(lsp.SemanticTokenTypes)}
 SEMANTIC_MODIFIER_LEGEND = {k: i for i, k in enumerate(lsp.SemanticTokenModifiers)}
 
+# Crosswalk asfv1 token types to LSP semantic token types
+TYPE_SEMANTICS: Mapping[str, lsp.SemanticTokenTypes] = MappingProxyType(
+    {
+        "MNEMONIC": lsp.SemanticTokenTypes.Function,
+        "INTEGER": lsp.SemanticTokenTypes.Number,
+        "FLOAT": lsp.SemanticTokenTypes.Number,
+        "ASSEMBLER": lsp.SemanticTokenTypes.Operator,
+        "ARGSEP": lsp.SemanticTokenTypes.Operator,
+        "LABEL": lsp.SemanticTokenTypes.Variable,
+        "TARGET": lsp.SemanticTokenTypes.Namespace,
+    }
+)
+
+
+class TokenSemantics(NamedTuple):
+    """The semantic type and modifiers of a token, with their integer encodings."""
+
+    type: lsp.SemanticTokenTypes | None
+    modifiers: tuple[lsp.SemanticTokenModifiers, ...]
+    type_index: int | None
+    """The index of the type in the legend, or None if the type isn't encoded."""
+    modifier_bitmask: int
+
+
+@functools.lru_cache(maxsize=None)
+def token_semantics(
+    token_type: str,
+    is_label: bool,
+    is_constant: bool,
+    is_modified: bool,
+    is_definition: bool,
+) -> TokenSemantics:
+    """
+    Infer the semantics of a combination of token type and flags.
+
+    There are only a few dozen combinations in practice, so each is inferred and
+    encoded once and shared by every token with the same type and flags.
+    """
+    semantic_type = TYPE_SEMANTICS.get(token_type)
+    if is_label:
+        semantic_type = lsp.SemanticTokenTypes.Namespace
+
+    modifiers: list[lsp.SemanticTokenModifiers] = []
+    if is_constant and token_type != "MNEMONIC":
+        modifiers += [
+            lsp.SemanticTokenModifiers.Readonly,
+            lsp.SemanticTokenModifiers.DefaultLibrary,
+        ]
+    if is_modified:
+        modifiers.append(lsp.SemanticTokenModifiers.Modification)
+    if is_definition:
+        modifiers.append(lsp.SemanticTokenModifiers.Definition)
+
+    return TokenSemantics(
+        type=semantic_type,
+        modifiers=tuple(modifiers),
+        type_index=SEMANTIC_TYPE_LEGEND.get(semantic_type),  # type: ignore[arg-type]
+        # The index of each modifier is encoded into a bitmask
+        modifier_bitmask=sum(1 << SEMANTIC_MODIFIER_LEGEND[mod] for mod in modifiers),
+    )
+
 
 @dataclass
 class ASFV1Token:
@@ -77,6 +154,12 @@ class ParsedToken:
         """Return a clone of the token to avoid mutating the original."""
         return copy.deepcopy(self)
 
+    def moved(self: _ParsedTokenT, lines: LineMap) -> _ParsedTokenT:
+        """Create a copy of the token moved to the current line of its original line."""
+        clone = copy.copy(self)
+        clone.range = lines.move_range(self.range)
+        return clone
+
     def without_address_modifier(self: _ParsedTokenT) -> _ParsedTokenT:
         """
         Create a clone of the token with the address modifier removed.
@@ -92,14 +175,15 @@ class ParsedToken:
 
     def concatenate(self: _ParsedTokenT, other: _ParsedTokenT) -> _ParsedTokenT:
         """
-        Concatenate by merging with another token, in place.
+        Create a clone of the token merged with another token.
 
         In practice, this is used for the multi-word opcodes that are parsed as separate
         tokens: CHO RDA, CHO RDAL, and CHO SOF.
         """
-        self.stxt += f" {other.stxt}"
-        self.range.end = other.range.end
-        return self
+        clone = self._clone()
+        clone.stxt += f" {other.stxt}"
+        clone.range.end = other.range.end
+        return clone
 
 
 class EvaluatedToken(ParsedToken):
@@ -129,6 +213,13 @@ class EvaluatedToken(ParsedToken):
         self.is_label = is_label
         self.is_opcode = self.type == "MNEMONIC"
 
+    def moved(self: _EvaluatedTokenT, lines: LineMap) -> _EvaluatedTokenT:
+        """Create a copy of the token with its range and definition moved."""
+        clone = super().moved(lines)
+        if self.defined is not None:
+            clone.defined = lines.move_range(self.defined)
+        return clone
+
     @classmethod
     def from_parsed_token(
         cls: type[_EvaluatedTokenT],
@@ -156,41 +247,24 @@ class SemanticTokenMixin(EvaluatedToken):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.semantic_type, self.semantic_modifiers = self._infer_semantics()
+        self.semantics = token_semantics(
+            self.type,
+            self.is_label,
+            self.is_constant,
+            self.stxt.endswith(("#", "^")),
+            self.defined == self.range,
+        )
+        """The semantic type and modifiers for the token."""
 
-    def _infer_semantics(
-        self,
-    ) -> tuple[lsp.SemanticTokenTypes, list[lsp.SemanticTokenModifiers]]:
-        """Infer the semantic type and modifiers for the token."""
-        # Crosswalk asfv1 token types to LSP semantic token types
-        type_semantics = {
-            "MNEMONIC": lsp.SemanticTokenTypes.Function,
-            "INTEGER": lsp.SemanticTokenTypes.Number,
-            "FLOAT": lsp.SemanticTokenTypes.Number,
-            "ASSEMBLER": lsp.SemanticTokenTypes.Operator,
-            "ARGSEP": lsp.SemanticTokenTypes.Operator,
-            "LABEL": lsp.SemanticTokenTypes.Variable,
-            "TARGET": lsp.SemanticTokenTypes.Namespace,
-        }
-
-        semantic_type = type_semantics.get(self.type)
-        if self.is_label:
-            semantic_type = lsp.SemanticTokenTypes.Namespace
-
-        semantic_modifiers = []
-        if self.is_constant and self.type != "MNEMONIC":
-            semantic_modifiers += [
-                lsp.SemanticTokenModifiers.Readonly,
-                lsp.SemanticTokenModifiers.DefaultLibrary,
-            ]
-
-        if self.stxt.endswith("#") or self.stxt.endswith("^"):
-            semantic_modifiers.append(lsp.SemanticTokenModifiers.Modification)
-
-        if self.defined == self.range:
-            semantic_modifiers.append(lsp.SemanticTokenModifiers.Definition)
-
-        return semantic_type, semantic_modifiers
+    @property
+    def semantic_type(self) -> lsp.SemanticTokenTypes | None:
+        """The semantic type of the token, if it has one."""
+        return self.semantics.type
+
+    @property
+    def semantic_modifiers(self) -> tuple[lsp.SemanticTokenModifiers, ...]:
+        """The semantic modifiers of the token."""
+        return self.semantics.modifiers
 
     def semantic_encoding(self, prev_token_start: lsp.Position) -> list[int]:
         """
@@ -205,6 +279,11 @@ class SemanticTokenMixin(EvaluatedToken):
 
         See https://microsoft.github.io/language-server-protocol/specifications/lsp/3.17/specification/#textDocument_semanticTokens
         """
+        semantics = self.semantics
+        # Return an empty semantic encoding if the type is unrecognized
+        if semantics.type_index is None:
+            return []
+
         # Set the token's position relative to the previous token. If we're on a new
         # line, set the character relative to zero.
         delta_line = self.range.start.line - prev_token_start.line
@@ -214,26 +293,74 @@ class SemanticTokenMixin(EvaluatedToken):
             else self.range.start.character - prev_token_start.character
         )
 
-        token_type = SEMANTIC_TYPE_LEGEND.get(self.semantic_type)
-        token_modifiers = [
-            SEMANTIC_MODIFIER_LEGEND.get(mod) for mod in self.semantic_modifiers
-        ]
-        # Return an empty semantic encoding if type or modifiers are unrecognized
-        if token_type is None or None in token_modifiers:
-            return []
-
-        # The index of each modifier is encoded into a bitmask
-        modifier_bitmask = sum(1 << i for i in token_modifiers)  # type: ignore
-
         return [
             delta_line,
             delta_start_char,
             len(self.stxt),
-            token_type,
-            modifier_bitmask,
+            semantics.type_index,
+            semantics.modifier_bitmask,
         ]
 
 
+def encode_semantics(tokens: Iterable[SemanticTokenMixin], size: int) -> memoryview:
+    """
+    Encode the semantics of tokens in order for semantic highlighting.
+
+    Encodings are written in a single pass into a preallocated array of unsigned ints,
+    which is returned as a read-only view that can be shared between requests.
+
+    Parameters
+    ----------
+    tokens : Iterable[SemanticTokenMixin]
+        The tokens to encode, in the order they appear in the source.
+    size : int
+        The number of tokens, used to size the array.
+    """
+    encoding = array("I", bytes(5 * size * array("I").itemsize))
+    i = 0
+    prev_line = prev_char = 0
+    for token in tokens:
+        semantics = token.semantics
+        # Tokens without semantic encoding (e.g. operators) should be ignored so that
+        # the next encoding is relative to the last encoded token. Otherwise,
+        # character offsets would be incorrect.
+        if semantics.type_index is None:
+            continue
+
+        start = token.range.start
+        delta_line = start.line - prev_line
+        encoding[i] = delta_line
+        encoding[i + 1] = start.character if delta_line else start.character - prev_char
+        encoding[i + 2] = len(token.stxt)
+        encoding[i + 3] = semantics.type_index
+        encoding[i + 4] = semantics.modifier_bitmask
+        prev_line, prev_char = start.line, start.character
+        i += 5
+
+    del encoding[i:]
+    return memoryview(encoding).toreadonly()
+
+
+def move_semantics(encoding: Sequence[int], lines: LineMap) -> memoryview:
+    """
+    Move encoded semantics to the current lines of their tokens.
+
+    Each token is encoded relative to the previous token, so only the first token
+    after the start of each moved run of lines changes.
+    """
+    moved = array("I", encoding)
+    token_lines = list(itertools.accumulate(moved[::5]))
+
+    previous = 0
+    for original, current, _ in lines.runs:
+        # Lines outside of the runs have no tokens, so they don't need to be moved
+        if (i := bisect.bisect_left(token_lines, original)) < len(token_lines):
+            moved[5 * i] += current - original - previous
+        previous = current - original
+
+    return memoryview(moved).toreadonly()
+
+
 class LSPTokenMixin(EvaluatedToken):
     """A mixin for evaluated tokens with LSP information."""
 
@@ -298,6 +425,7 @@ class LSPTokenMixin(EvaluatedToken):
         return lsp.DocumentSymbol(
             name=self.stxt,
             kind=self.symbol_kind,
+            detail=self.completion_detail,
             range=self.defined,
             selection_range=self.defined,
         )
@@ -307,25 +435,114 @@ class LSPToken(LSPTokenMixin, SemanticTokenMixin):
     """An evaluated token with semantic and LSP information."""
 
 
+@dataclass(frozen=True)
+class SymbolReferences:
+    """The definition and all occurrences of a user-definable symbol."""
+
+    name: str
+    """The name of the symbol without address modifiers."""
+
+    defined: lsp.Range | None
+    """The range where the symbol is defined, if applicable."""
+
+    ranges: tuple[lsp.Range, ...] = ()
+    """The range of each occurrence, excluding address modifiers."""
+
+    full_ranges: tuple[lsp.Range, ...] = ()
+    """The range of each occurrence, including address modifiers."""
+
+
+@dataclass(frozen=True)
+class OpcodeArguments:
+    """An opcode and the positions of the argument separators that follow it."""
+
+    opcode: EvaluatedToken
+
+    separators: tuple[int, ...] = ()
+    """The start character of each argument separator after the opcode."""
+
+    def active_parameter(self, character: int) -> int:
+        """Return the index of the argument being entered at the given character."""
+        return bisect.bisect_left(self.separators, character)
+
+
 class TokenLookup(Generic[_ParsedTokenT]):
-    """A lookup table for tokens by position and name."""
+    """
+    A lookup table for tokens by position and name.
+
+    Once all tokens are added, the lookup can be frozen to prevent further changes so
+    that it can be safely read from multiple threads.
+
+    A frozen lookup can be moved to match a source where lines without code were
+    inserted or deleted. The moved lookup shares the original tokens, which stay keyed
+    by their original lines, and only moves the tokens that are retrieved.
+    """
 
     def __init__(self):
         self._prev_token: _ParsedTokenT | None = None
-        self._line_lookup: dict[int, list[_ParsedTokenT]] = {}
-        self._name_lookup: dict[str, list[_ParsedTokenT]] = {}
+        self._line_lookup: Mapping[int, Sequence[_ParsedTokenT]] = {}
+        self._name_lookup: Mapping[str, Sequence[_ParsedTokenT]] = {}
+        self._lines: LineMap | None = None
+        self._frozen = False
+
+    @property
+    def frozen(self) -> bool:
+        """Whether the lookup is frozen."""
+        return self._frozen
+
+    def freeze(self) -> None:
+        """Prevent adding tokens to the lookup."""
+        self._line_lookup = MappingProxyType(
+            {line: tuple(tokens) for line, tokens in self._line_lookup.items()}
+        )
+        self._name_lookup = MappingProxyType(
+            {name: tuple(tokens) for name, tokens in self._name_lookup.items()}
+        )
+        self._prev_token = None
+        self._frozen = True
+
+    def __len__(self) -> int:
+        """Return the number of tokens."""
+        return sum(len(line) for line in self._line_lookup.values())
 
     def __iter__(self) -> Generator[_ParsedTokenT, None, None]:
         """Yield all tokens in order."""
         for line in self._line_lookup.values():
-            yield from line
+            yield from self._moved(line)
+
+    def moved(self, lines: LineMap) -> TokenLookup[_ParsedTokenT]:
+        """Create a copy of the frozen lookup with its lines moved."""
+        if not self._frozen:
+            raise RuntimeError("Only frozen lookups can be moved.")
+
+        lookup: TokenLookup[_ParsedTokenT] = TokenLookup()
+        lookup._line_lookup = self._line_lookup
+        lookup._name_lookup = self._name_lookup
+        lookup._lines = lines if self._lines is None else self._lines.then(lines)
+        lookup._frozen = True
+        return lookup
+
+    def _moved(self, tokens: Sequence[_ParsedTokenT]) -> Sequence[_ParsedTokenT]:
+        """Move tokens from their original lines to their current lines."""
+        if self._lines is None:
+            return tokens
+        return tuple(token.moved(self._lines) for token in tokens)
+
+    def _tokens_on_line(self, line: int) -> Sequence[_ParsedTokenT]:
+        """Retrieve the tokens on a current line."""
+        if self._lines is not None:
+            if (original := self._lines.to_original(line)) is None:
+                return ()
+            line = original
+
+        return self._moved(self._line_lookup.get(line, ()))
 
     @overload
     def get(self, *, position: lsp.Position) -> _ParsedTokenT | None: ...
     @overload
-    def get(self, *, name: str) -> list[_ParsedTokenT]: ...
+    def get(self, *, name: str) -> Sequence[_ParsedTokenT]: ...
     @overload
-    def get(self, *, line: int) -> list[_ParsedTokenT]: ...
+    def get(self, *, line: int) -> Sequence[_ParsedTokenT]: ...
 
     def get(
         self,
@@ -333,7 +550,7 @@ class TokenLookup(Generic[_ParsedTokenT]):
         position: lsp.Position | None = None,
         name: str | None = None,
         line: int | None = None,
-    ) -> _ParsedTokenT | list[_ParsedTokenT] | None:
+    ) -> _ParsedTokenT | Sequence[_ParsedTokenT] | None:
         ...
         """Retrieve a token by position, name, or line."""
         # Raise if more than one argument is provided
@@ -343,25 +560,33 @@ class TokenLookup(Generic[_ParsedTokenT]):
         if position is not None:
             return self._token_at_position(position)
         if line is not None:
-            return self._line_lookup.get(line, [])
+            return self._tokens_on_line(line)
         if name is not None:
-            return self._name_lookup.get(name.upper(), [])
+            return self._moved(self._name_lookup.get(name.upper(), ()))
         raise ValueError("Either a position, name, or line must be provided.")
 
     def add_token(self, token: _ParsedTokenT) -> None:
         """Store a token for future lookup."""
-        # Handle multi-word CHO instructions by merging the second token with the first
-        # and skipping the second token.
+        if self._frozen:
+            raise RuntimeError("Tokens can't be added to a frozen lookup.")
+
+        line_lookup: dict[int, list[_ParsedTokenT]] = self._line_lookup  # type: ignore
+        name_lookup: dict[str, list[_ParsedTokenT]] = self._name_lookup  # type: ignore
+
+        # Handle multi-word CHO instructions by replacing the first token with a merged
+        # token and skipping the second token.
         if (
             self._prev_token
             and self._prev_token.stxt == "CHO"
             and token.stxt in ("RDA", "RDAL", "SOF")
         ):
-            self._prev_token.concatenate(token)  # type: ignore
+            merged = self._prev_token.concatenate(token)
+            line_lookup[merged.range.start.line][-1] = merged
+            self._prev_token = merged
             return
 
         # Store the token on its line
-        self._line_lookup.setdefault(token.range.start.line, []).append(token)
+        line_lookup.setdefault(token.range.start.line, []).append(token)
         self._prev_token = token
 
         # Store user-defined tokens together by name. Other token types could be stored,
@@ -371,14 +596,13 @@ class TokenLookup(Generic[_ParsedTokenT]):
             # and Delay can be retrieved with the same query. This allows for renaming
             # all instances of a memory token.
             base_token = token.without_address_modifier()
-            self._name_lookup.setdefault(base_token.stxt, []).append(base_token)
+            name_lookup.setdefault(base_token.stxt, []).append(base_token)
 
     def _token_at_position(self, position: lsp.Position) -> _ParsedTokenT | None:
         """Retrieve the token at the given position."""
-        if position.line not in self._line_lookup:
+        if not (line_tokens := self._tokens_on_line(position.line)):
             return None
 
-        line_tokens = self._line_lookup[position.line]
         token_starts = [t.range.start.character for t in line_tokens]
         token_ends = [t.range.end.character for t in line_tokens]
 
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+import platform
+from pathlib import Path
+
+import pytest
+
+from spinasm_lsp import __version__
+
+
+def synthetic_program(n_blocks: int) -> str:
+    """
+    Generate a program with a delay, a constant, and a skip label in each block.
+
+    Each block has 5 instructions, so programs with more than 25 blocks exceed the
+    instruction limit and also produce diagnostics.
+    """
+    lines = [f"; Synthetic program with {n_blocks} blocks"]
+    for i in range(n_blocks):
+        lines += [
+            f"mem\tdelay{i}\t10",
+            f"equ\tgain{i}\t0.{i % 9 + 1}",
+            f"rdax\tadcl, gain{i}",
+            f"wra\tdelay{i}, 0",
+            f"skp\trun, end{i}",
+            f"rda\tdelay{i}#, 0.5",
+            "sof\t0, 0",
+            f"end{i}:",
+        ]
+
+    return "\n".join(lines) + "\n"
+
+
+class BenchmarkResults:
+    """Collect named measurements and write them to a JSON file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.results: dict[str, dict[str, float]] = {}
+
+    def add(self, name: str, **measurements: float) -> None:
+        self.results.setdefault(name, {}).update(
+            {key: round(value, 6) for key, value in measurements.items()}
+        )
+
+    def write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        output = {
+            "version": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": dict(sorted(self.results.items())),
+        }
+        self.path.write_text(json.dumps(output, indent=2) + "\n")
+
+
+@pytest.fixture(scope="session")
+def latency_results(request):
+    """Latency measurements, written to `.benchmarks/latency.json` after the run."""
+    results = BenchmarkResults(request.config.rootpath / ".benchmarks" / "latency.json")
+    yield results
+
+    if results.results:
+        results.write()
+
+
+@pytest.fixture(scope="session")
+def allocation_results(request):
+    """Allocation measurements, written to `.benchmarks/allocations.json`."""
+    results = BenchmarkResults(
+        request.config.rootpath / ".benchmarks" / "allocations.json"
+    )
+    yield results
+
+    if results.results:
+        results.write()
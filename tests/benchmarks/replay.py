@@ -0,0 +1,256 @@
+"""
+Replay a recorded session against the server and measure its performance.
+
+Sessions are recorded by starting the server with `spinasm-lsp --record PATH`. The
+client messages of one recorded session are replayed against a new server with the
+original pacing, and the latency of each request and the CPU time used by the server
+are reported.
+
+Usage:
+
+    python -m tests.benchmarks.replay session.jsonl [--speed 0] [--output stats.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import lsprotocol.types as lsp
+from pygls.exceptions import JsonRpcRequestCancelled
+from pytest_lsp import make_test_lsp_client
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore
+
+SERVER_COMMAND = [sys.executable, "-m", "spinasm_lsp.server"]
+
+
+@dataclass
+class ReplayResult:
+    """Measurements from replaying a session."""
+
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    """The latency of each request in seconds, by method."""
+
+    cancelled: int = 0
+    """The number of requests that were cancelled before they finished."""
+
+    wall_time: float = 0.0
+    """The total time to replay the session, in seconds."""
+
+    server_cpu_time: float | None = None
+    """The user and system CPU time used by the server, in seconds, if available."""
+
+    def summary(self) -> dict:
+        """Summarize request latencies by method as percentiles in milliseconds."""
+        methods = {
+            method: _percentiles(latencies)
+            for method, latencies in sorted(self.latencies.items())
+        }
+        every = [
+            latency for latencies in self.latencies.values() for latency in latencies
+        ]
+
+        return {
+            "wall_time": round(self.wall_time, 3),
+            "server_cpu_time": (
+                None if self.server_cpu_time is None else round(self.server_cpu_time, 3)
+            ),
+            "cancelled": self.cancelled,
+            "all": _percentiles(every),
+            "methods": methods,
+        }
+
+
+def _percentiles(latencies: list[float]) -> dict:
+    """Return the count and latency percentiles in milliseconds."""
+    if not latencies:
+        return {"count": 0}
+
+    ms = sorted(latency * 1000 for latency in latencies)
+    cuts = (
+        statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    )
+    return {
+        "count": len(ms),
+        "p50": round(cuts[49], 3),
+        "p90": round(cuts[89], 3),
+        "p99": round(cuts[98], 3),
+        "max": round(ms[-1], 3),
+    }
+
+
+def load_session(path: str | os.PathLike, session: int | None = None) -> list[dict]:
+    """
+    Load the messages sent by the client in one recorded session.
+
+    Responses to requests from the server are skipped, because the replaying client
+    answers those itself. If no session is given, the first recorded session is used.
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if session is None:
+                session = record["session"]
+            if (
+                record["session"] == session
+                and record["from"] == "client"
+                and "method" in record["message"]
+            ):
+                records.append(record)
+
+    return records
+
+
+async def replay(
+    records: list[dict],
+    server_command: list[str] | None = None,
+    speed: float = 1.0,
+) -> ReplayResult:
+    """
+    Replay recorded client messages against a new server.
+
+    Parameters
+    ----------
+    records : list[dict]
+        Recorded client messages, as returned by `load_session`.
+    server_command : list[str], optional
+        The command that starts the server.
+    speed : float
+        How fast to replay relative to the recording. Messages are sent as fast as
+        possible if 0.
+    """
+    server_command = server_command or SERVER_COMMAND
+    result = ReplayResult()
+    client = make_test_lsp_client()
+    converter = client.protocol._converter
+    pending: list[asyncio.Future] = []
+    # Replayed requests get new ids, so cancellations must refer to those instead
+    request_ids: dict[int | str, str] = {}
+
+    async def measure(method: str, response: asyncio.Future, start: float) -> None:
+        try:
+            await response
+        except JsonRpcRequestCancelled:
+            result.cancelled += 1
+            return
+        result.latencies.setdefault(method, []).append(time.perf_counter() - start)
+
+    def send_request(method: str, params: object, msg_id: str) -> asyncio.Future:
+        # Send immediately so that later messages can't overtake the request
+        start = time.perf_counter()
+        response = client.protocol.send_request(method, params, msg_id=msg_id)
+        return asyncio.ensure_future(
+            measure(method, asyncio.wrap_future(response), start)
+        )
+
+    cpu_before = _children_cpu_time()
+    await client.start_io(*server_command)
+    start = time.perf_counter()
+
+    for record in records:
+        if speed > 0:
+            delay = start + record["time"] / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        message = record["message"]
+        method = message["method"]
+        params = _structure_params(converter, method, message.get("params"))
+        if "id" in message:
+            msg_id = request_ids[message["id"]] = str(uuid.uuid4())
+        elif isinstance(params, lsp.CancelParams) and params.id in request_ids:
+            params.id = request_ids[params.id]
+
+        if method == lsp.INITIALIZE:
+            # Clients can't send anything else until the server is initialized
+            client.capabilities = params.capabilities  # type: ignore[attr-defined]
+            await send_request(method, params, msg_id)
+        elif method == lsp.EXIT:
+            # Wait for outstanding requests so that they aren't cut off
+            await asyncio.gather(*pending)
+            client.protocol.notify(method, params)
+            break
+
+        elif "id" in message:
+            pending.append(send_request(method, params, msg_id))
+        else:
+            client.protocol.notify(method, params)
+
+    await asyncio.gather(*pending)
+    result.wall_time = time.perf_counter() - start
+
+    if client._server is not None and client._server.returncode is None:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(client._server.wait(), timeout=5)
+    await client.stop()
+
+    cpu_after = _children_cpu_time()
+    if cpu_before is not None and cpu_after is not None:
+        result.server_cpu_time = cpu_after - cpu_before
+
+    return result
+
+
+def _structure_params(converter, method: str, params: object) -> object:
+    """Convert recorded parameters to the types the client expects for a method."""
+    if method == lsp.INITIALIZE and isinstance(params, dict):
+        params = {**params, "processId": os.getpid()}
+
+    if params is None or method not in lsp.METHOD_TO_TYPES:
+        return params
+
+    params_type = lsp.METHOD_TO_TYPES[method][2]
+    return params if params_type is None else converter.structure(params, params_type)
+
+
+def _children_cpu_time() -> float | None:
+    """Return the CPU time used by finished child processes, if available."""
+    if resource is None:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("recording", type=Path, help="The recorded session.")
+    parser.add_argument(
+        "--session", type=int, help="The recorded session to replay. Default: first."
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Replay speed relative to the recording, or 0 for as fast as possible.",
+    )
+    parser.add_argument("--output", type=Path, help="Write the summary as JSON.")
+    args = parser.parse_args(argv)
+
+    records = load_session(args.recording, args.session)
+    result = asyncio.run(replay(records, speed=args.speed))
+    summary = result.summary()
+
+    if args.output:
+        args.output.write_text(json.dumps(summary, indent=2))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""Benchmark the allocations made by each stage of parsing."""
+
+from __future__ import annotations
+
+import pytest
+
+from ..test_allocations import PROGRAMS, allocations_per_token
+from .conftest import BenchmarkResults
+
+
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_allocations_per_token(
+    name: str, allocation_results: BenchmarkResults, record_property
+):
+    """Measure the allocations of each parsing stage per token."""
+    n_tokens, stages = allocations_per_token(PROGRAMS[name])
+
+    for stage, per_token in stages.items():
+        measurements = {
+            "blocks_per_token": per_token.blocks,
+            "size_per_token": per_token.size,
+            "peak_per_token": per_token.peak,
+        }
+        allocation_results.add(f"{name}/{stage}", tokens=n_tokens, **measurements)
+        for key, value in measurements.items():
+            record_property(f"{stage}_{key}", round(value, 1))
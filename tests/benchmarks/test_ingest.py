@@ -0,0 +1,94 @@
+"""Benchmark reading patches in bulk against reading them one at a time."""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from spinasm_lsp import ingest
+from spinasm_lsp.parser import SPINAsmParser
+
+from ..conftest import TEST_PATCHES
+
+# Copies of each test patch, to approximate a large workspace of small files
+N_COPIES = 50
+
+
+@pytest.fixture(scope="module")
+def workspace(tmp_path_factory):
+    """A folder with many copies of the test patches."""
+    root = tmp_path_factory.mktemp("workspace")
+    paths = []
+    for patch in TEST_PATCHES:
+        data = patch.read_bytes()
+        for i in range(N_COPIES):
+            path = root / f"{patch.stem}_{i}.spn"
+            path.write_bytes(data)
+            paths.append(path)
+
+    return paths
+
+
+def read_per_file(paths):
+    """Read each patch as text, the way a single document would be read."""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            yield path, f.read()
+
+
+def best_time(func, repeats: int = 3) -> float:
+    """Return the fastest of several runs of a function, in seconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def test_bulk_reading(workspace, record_property):
+    """Compare reading the workspace one file at a time and in bulk."""
+
+    def per_file():
+        for _, source in read_per_file(workspace):
+            source.split("\n")
+
+    def bulk():
+        for _ in ingest.read_many(workspace):
+            pass
+
+    per_file_seconds = best_time(per_file)
+    bulk_seconds = best_time(bulk)
+
+    record_property("files", len(workspace))
+    record_property("per_file_seconds", round(per_file_seconds, 4))
+    record_property("bulk_seconds", round(bulk_seconds, 4))
+    print(
+        f"Read {len(workspace)} files: {per_file_seconds:.4f}s per file, "
+        f"{bulk_seconds:.4f}s bulk"
+    )
+
+
+def test_bulk_parsing(workspace, record_property):
+    """Compare reading and parsing the workspace one file at a time and in bulk."""
+
+    def per_file():
+        for _, source in read_per_file(workspace):
+            SPINAsmParser(source)
+
+    def bulk():
+        for _ in ingest.parse_many(workspace):
+            pass
+
+    per_file_seconds = best_time(per_file, repeats=1)
+    bulk_seconds = best_time(bulk, repeats=1)
+
+    record_property("files", len(workspace))
+    record_property("per_file_seconds", round(per_file_seconds, 4))
+    record_property("bulk_seconds", round(bulk_seconds, 4))
+    print(
+        f"Parsed {len(workspace)} files: {per_file_seconds:.4f}s per file, "
+        f"{bulk_seconds:.4f}s bulk"
+    )
@@ -0,0 +1,127 @@
+"""Benchmark end-to-end request latency through a language client."""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+
+import lsprotocol.types as lsp
+import pytest
+import pytest_lsp
+from pytest_lsp import LanguageClient
+
+from spinasm_lsp.parser import SPINAsmParser
+
+from ..conftest import TEST_PATCHES, TestCase, parametrize_cases
+from .conftest import BenchmarkResults, synthetic_program
+
+CLIENT_PROFILES = ["neovim", "visual_studio_code"]
+
+
+@dataclass
+class LatencyTestCase(TestCase):
+    """A program to measure request latency for."""
+
+    source: str
+
+
+TEST_CASES: list[LatencyTestCase] = [
+    *(
+        LatencyTestCase(name=patch.stem, source=patch.read_text(encoding="utf-8"))
+        for patch in TEST_PATCHES
+    ),
+    *(
+        LatencyTestCase(name=f"synthetic_{n}", source=synthetic_program(n))
+        for n in (10, 100, 500)
+    ),
+]
+
+
+def symbol_position(source: str) -> lsp.Position:
+    """Return the position of the first user-defined symbol in a program."""
+    parser = SPINAsmParser(source, position_encoding=lsp.PositionEncodingKind.Utf16)
+    if parser.document_symbols:
+        return parser.document_symbols[0].selection_range.start
+    return lsp.Position(line=0, character=0)
+
+
+async def timed(awaitable) -> float:
+    """Await a request and return the elapsed time in seconds."""
+    start = time.perf_counter()
+    await awaitable
+    return time.perf_counter() - start
+
+
+@pytest.mark.parametrize("profile", CLIENT_PROFILES)
+@pytest.mark.asyncio()
+async def test_initialize_latency(
+    profile: str,
+    uninitialized_client: LanguageClient,
+    latency_results: BenchmarkResults,
+):
+    """Measure the latency of initializing a new server."""
+    capabilities = pytest_lsp.client_capabilities(profile)
+
+    elapsed = await timed(
+        uninitialized_client.initialize_session(
+            lsp.InitializeParams(capabilities=capabilities)
+        )
+    )
+
+    latency_results.add(f"{profile}/initialize", seconds=elapsed)
+    assert elapsed > 0
+
+
+@parametrize_cases(TEST_CASES)
+@pytest.mark.asyncio()
+async def test_request_latency(
+    test_case: LatencyTestCase,
+    client: LanguageClient,
+    latency_results: BenchmarkResults,
+    request,
+):
+    """Measure the latency of diagnostics and common requests for a program."""
+    profile = request.node.callspec.params["client"]
+    uri = f"file:///{test_case.name}.spn"
+    document = lsp.TextDocumentIdentifier(uri=uri)
+    position = symbol_position(test_case.source)
+
+    diagnostics = client.protocol.wait_for_notification_async(
+        lsp.TEXT_DOCUMENT_PUBLISH_DIAGNOSTICS
+    )
+    client.text_document_did_open(
+        lsp.DidOpenTextDocumentParams(
+            text_document=lsp.TextDocumentItem(
+                uri=uri, language_id="spinasm", version=0, text=test_case.source
+            )
+        )
+    )
+
+    latencies = {
+        "diagnostics": await timed(diagnostics),
+        "hover": await timed(
+            client.text_document_hover_async(
+                lsp.HoverParams(text_document=document, position=position)
+            )
+        ),
+        "completion": await timed(
+            client.text_document_completion_async(
+                lsp.CompletionParams(text_document=document, position=position)
+            )
+        ),
+        "semantic_tokens": await timed(
+            client.text_document_semantic_tokens_full_async(
+                lsp.SemanticTokensParams(text_document=document)
+            )
+        ),
+        "rename": await timed(
+            client.text_document_rename_async(
+                lsp.RenameParams(
+                    text_document=document, position=position, new_name="renamed"
+                )
+            )
+        ),
+    }
+
+    latency_results.add(f"{profile}/{test_case.name}", **latencies)
+    assert all(latency > 0 for latency in latencies.values())
@@ -0,0 +1,32 @@
+"""Benchmark the memory retained by parsed programs."""
+
+from __future__ import annotations
+
+import pytest
+
+from spinasm_lsp.memory import deep_sizeof
+from spinasm_lsp.parser import SPINAsmParser
+
+from ..conftest import TEST_PATCHES
+
+
+def bytes_per_token(parser: SPINAsmParser) -> float:
+    """Return the estimated bytes retained by the parser per evaluated token."""
+    n_tokens = sum(1 for _ in parser.evaluated_tokens)
+    return deep_sizeof(parser) / max(n_tokens, 1)
+
+
+@pytest.mark.parametrize("patch", TEST_PATCHES, ids=lambda x: x.stem)
+def test_compaction_reduces_memory(patch, record_property):
+    """Test that compacting a parser reduces the memory retained per token."""
+    with open(patch, encoding="utf-8") as f:
+        source = f.read()
+
+    before = bytes_per_token(SPINAsmParser(source, compact=False))
+    after = bytes_per_token(SPINAsmParser(source))
+
+    record_property("bytes_per_token_before", round(before, 1))
+    record_property("bytes_per_token_after", round(after, 1))
+    print(f"{patch.stem}: {before:.1f} -> {after:.1f} bytes per token")
+
+    assert after < before
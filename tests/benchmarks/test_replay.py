@@ -0,0 +1,110 @@
+"""Test recording a session and replaying it against the server."""
+
+from __future__ import annotations
+
+import json
+import sys
+
+import lsprotocol.types as lsp
+import pytest
+from pytest_lsp import make_test_lsp_client
+
+from ..conftest import PATCH_DIR
+from .replay import load_session, replay
+
+
+async def record_session(path) -> None:
+    """Record a short editing session with hover, completion, and semantic tokens."""
+    client = make_test_lsp_client()
+    await client.start_io(
+        sys.executable, "-m", "spinasm_lsp.server", "--record", str(path)
+    )
+    await client.initialize_session(
+        lsp.InitializeParams(capabilities=lsp.ClientCapabilities())
+    )
+
+    patch = PATCH_DIR / "Basic.spn"
+    uri = patch.as_uri()
+    client.text_document_did_open(
+        lsp.DidOpenTextDocumentParams(
+            text_document=lsp.TextDocumentItem(
+                uri=uri, language_id="spinasm", version=0, text=patch.read_text()
+            )
+        )
+    )
+    document = lsp.TextDocumentIdentifier(uri=uri)
+    position = lsp.Position(line=23, character=3)
+    await client.text_document_hover_async(
+        lsp.HoverParams(text_document=document, position=position)
+    )
+    await client.text_document_completion_async(
+        lsp.CompletionParams(text_document=document, position=position)
+    )
+    await client.text_document_semantic_tokens_full_async(
+        lsp.SemanticTokensParams(text_document=document)
+    )
+
+    await client.shutdown_session()
+    await client.stop()
+
+
+@pytest.mark.asyncio()
+async def test_record_and_replay(tmp_path, record_property):
+    """Test that a recorded session replays with latencies for each request."""
+    recording = tmp_path / "session.jsonl"
+    await record_session(recording)
+
+    senders = {json.loads(line)["from"] for line in recording.read_text().splitlines()}
+    assert senders == {"client", "server"}
+
+    records = load_session(recording)
+    methods = [record["message"]["method"] for record in records]
+    assert methods[:2] == [lsp.INITIALIZE, lsp.INITIALIZED]
+    assert methods[-2:] == [lsp.SHUTDOWN, lsp.EXIT]
+
+    result = await replay(records, speed=0)
+    summary = result.summary()
+
+    for method in (
+        lsp.INITIALIZE,
+        lsp.TEXT_DOCUMENT_HOVER,
+        lsp.TEXT_DOCUMENT_COMPLETION,
+        lsp.TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL,
+        lsp.SHUTDOWN,
+    ):
+        assert summary["methods"][method]["count"] == 1
+
+    record_property("replay_summary", json.dumps(summary))
+    print(json.dumps(summary, indent=2))
+
+
+@pytest.mark.asyncio()
+async def test_replay_cancels_replayed_requests(tmp_path):
+    """Test that cancellations refer to the ids of the replayed requests."""
+    uri = (PATCH_DIR / "Basic.spn").as_uri()
+    messages = [
+        {"id": 0, "method": lsp.INITIALIZE, "params": {"capabilities": {}}},
+        {"method": lsp.INITIALIZED, "params": {}},
+        {
+            "id": 1,
+            "method": lsp.TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL,
+            "params": {"textDocument": {"uri": uri}},
+        },
+        {"method": lsp.CANCEL_REQUEST, "params": {"id": 1}},
+        {"id": 2, "method": lsp.SHUTDOWN},
+        {"method": lsp.EXIT},
+    ]
+    records = [{"time": 0, "message": message} for message in messages]
+
+    recording = tmp_path / "replayed.jsonl"
+    server_command = [sys.executable, "-m", "spinasm_lsp.server"]
+    await replay(records, server_command=[*server_command, "--record", str(recording)])
+
+    replayed = [record["message"] for record in load_session(recording)]
+    request, cancel = (
+        message
+        for message in replayed
+        if message["method"]
+        in (lsp.TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL, lsp.CANCEL_REQUEST)
+    )
+    assert cancel["params"]["id"] == request["id"] != 1
@@ -0,0 +1,45 @@
+"""Benchmark parsing the test patches with and without cached line scans."""
+
+from __future__ import annotations
+
+import time
+
+from spinasm_lsp.parser import ScanCache, SPINAsmParser
+
+from ..conftest import TEST_PATCHES
+
+REPEATS = 5
+
+
+def parse_all(sources: list[str], cache: ScanCache | None) -> float:
+    """Parse every source, returning the elapsed time."""
+    start = time.perf_counter()
+    for source in sources:
+        SPINAsmParser(source, scan_cache=cache).parse()
+    return time.perf_counter() - start
+
+
+def test_scan_cache(record_property):
+    """Compare parsing with no cache, a cold cache, and a warm cache."""
+    sources = [patch.read_text() for patch in TEST_PATCHES]
+
+    uncached = min(parse_all(sources, None) for _ in range(REPEATS))
+
+    cold_cache = ScanCache()
+    cold = parse_all(sources, cold_cache)
+    cold_hit_rate = cold_cache.hit_rate
+
+    warm = min(parse_all(sources, cold_cache) for _ in range(REPEATS))
+
+    # Re-parsing unchanged sources never scans a line
+    assert cold_cache.misses == len(cold_cache)
+
+    record_property("uncached_seconds", round(uncached, 6))
+    record_property("cold_seconds", round(cold, 6))
+    record_property("warm_seconds", round(warm, 6))
+    record_property("cold_hit_rate", round(cold_hit_rate, 3))
+    print(
+        f"Parsed {len(sources)} patches: {uncached * 1000:.1f}ms uncached, "
+        f"{cold * 1000:.1f}ms cold ({cold_hit_rate:.0%} hits), "
+        f"{warm * 1000:.1f}ms warm"
+    )
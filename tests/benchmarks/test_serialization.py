@@ -0,0 +1,98 @@
+"""Benchmark encoding the largest responses against the generic converter."""
+
+from __future__ import annotations
+
+import json
+import time
+
+import lsprotocol.types as lsp
+import pytest
+from pygls.protocol import default_converter
+
+from spinasm_lsp.parser import SPINAsmParser
+from spinasm_lsp.serialization import encode_response
+from spinasm_lsp.server import server
+
+from ..conftest import TEST_PATCHES
+
+REPEATS = 20
+
+
+def semantic_tokens(parser: SPINAsmParser, uri: str) -> lsp.ResponseMessage:
+    return lsp.TextDocumentSemanticTokensFullResponse(
+        id=0, result=lsp.SemanticTokens(data=parser.semantic_encoding)
+    )
+
+
+def completions(parser: SPINAsmParser, uri: str) -> lsp.ResponseMessage:
+    symbols = {
+        token.stxt: token.completion_item
+        for token in parser.evaluated_tokens
+        if token.type in ("LABEL", "TARGET")
+    }
+    return lsp.TextDocumentCompletionResponse(
+        id=0,
+        result=lsp.CompletionList(
+            is_incomplete=False,
+            items=list(symbols.values()) + server.static_completions,
+        ),
+    )
+
+
+def references(parser: SPINAsmParser, uri: str) -> lsp.ResponseMessage:
+    """All references to every symbol, as one response."""
+    return lsp.TextDocumentReferencesResponse(
+        id=0,
+        result=[
+            lsp.Location(uri=uri, range=r)
+            for refs in parser.symbol_references.values()
+            for r in refs.ranges
+        ],
+    )
+
+
+@pytest.fixture(scope="module")
+def corpus() -> list[tuple[SPINAsmParser, str]]:
+    return [
+        (SPINAsmParser(patch.read_text()), patch.as_uri()) for patch in TEST_PATCHES
+    ]
+
+
+@pytest.mark.parametrize("response", [semantic_tokens, completions, references])
+def test_fast_serialization(response, corpus, record_property):
+    """Compare encoding responses over the test patches with each serializer."""
+    messages = [response(parser, uri) for parser, uri in corpus]
+    converter = default_converter()
+
+    def generic(message) -> str:
+        """Encode a message the way pygls does."""
+        return json.dumps(message, default=converter.unstructure)
+
+    def fast(message) -> str:
+        body = encode_response(message, converter)
+        assert body is not None
+        return body
+
+    def encode(serialize) -> tuple[float, list[str]]:
+        """Encode every message, returning the best time and the encodings."""
+        best = float("inf")
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            bodies = [serialize(m) for m in messages]
+            best = min(best, time.perf_counter() - start)
+
+        return best, bodies
+
+    generic_seconds, generic_bodies = encode(generic)
+    fast_seconds, fast_bodies = encode(fast)
+
+    assert [json.loads(b) for b in fast_bodies] == [
+        json.loads(b) for b in generic_bodies
+    ]
+
+    record_property("generic_seconds", round(generic_seconds, 6))
+    record_property("fast_seconds", round(fast_seconds, 6))
+    print(
+        f"Encoded {response.__name__} for {len(messages)} patches: "
+        f"{generic_seconds * 1000:.3f}ms generic, {fast_seconds * 1000:.3f}ms fast"
+    )
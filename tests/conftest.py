@@ -12,6 +12,28 @@ PATCH_DIR = Path(__file__).parent / "patches"
 TEST_PATCHES = list(PATCH_DIR.glob("*.spn"))
 assert TEST_PATCHES, "No test patches found in the patches directory."
 
+BENCHMARK_DIR = Path(__file__).parent / "benchmarks"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmarks",
+        action="store_true",
+        default=False,
+        help="Run the benchmarks in tests/benchmarks, which are skipped by default.",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip benchmarks unless they're requested with `--benchmarks`."""
+    if config.getoption("--benchmarks"):
+        return
+
+    skip = pytest.mark.skip(reason="Benchmarks only run with --benchmarks")
+    for item in items:
+        if BENCHMARK_DIR in item.path.parents:
+            item.add_marker(skip)
+
 
 @pytest_lsp.fixture(
     params=["neovim", "visual_studio_code"],
@@ -29,6 +51,14 @@ async def client(request, lsp_client: LanguageClient):
     await lsp_client.shutdown_session()
 
 
+@pytest_lsp.fixture(config=ClientServerConfig(server_command=["spinasm-lsp"]))
+async def uninitialized_client(lsp_client: LanguageClient):
+    """A client fixture that leaves initialization to the test."""
+    yield
+
+    await lsp_client.shutdown_session()
+
+
 @dataclass
 class TestCase:
     """The inputs and outputs of a test case."""
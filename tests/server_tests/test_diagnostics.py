@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
 
 import lsprotocol.types as lsp
@@ -110,3 +111,74 @@ async def test_diagnostic_parsing_errors(
 
     for expected, actual in zip(test_case.expected, returned):
         assert actual == expected, "Diagnostic does not match expected"
+
+
+@pytest.mark.asyncio()
+async def test_identical_diagnostics_not_republished(client: LanguageClient):
+    """Test that diagnostics are only republished when they change."""
+    test_uri = "dummy_uri"
+    source = "SOF 0, a\n"
+
+    client.text_document_did_open(
+        lsp.DidOpenTextDocumentParams(
+            text_document=lsp.TextDocumentItem(
+                uri=test_uri, language_id="spinasm", version=1, text=source
+            )
+        )
+    )
+    await client.wait_for_notification(lsp.TEXT_DOCUMENT_PUBLISH_DIAGNOSTICS)
+
+    def change_document(text: str, version: int) -> None:
+        client.text_document_did_change(
+            lsp.DidChangeTextDocumentParams(
+                text_document=lsp.VersionedTextDocumentIdentifier(
+                    uri=test_uri, version=version
+                ),
+                content_changes=[lsp.TextDocumentContentChangeEvent_Type2(text=text)],
+            )
+        )
+
+    # Editing a comment changes the source, but not the diagnostics
+    change_document(source + "; a comment\n", version=2)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(
+            client.wait_for_notification(lsp.TEXT_DOCUMENT_PUBLISH_DIAGNOSTICS),
+            timeout=0.5,
+        )
+
+    # Fixing the error changes the diagnostics, so they should be republished
+    change_document("SOF 0, 0\n", version=3)
+    await client.wait_for_notification(lsp.TEXT_DOCUMENT_PUBLISH_DIAGNOSTICS)
+    assert client.diagnostics[test_uri] == []
+
+
+@pytest.mark.asyncio()
+async def test_large_documents_are_only_scanned(uninitialized_client: LanguageClient):
+    """Test that documents over the size limit report scanning in place of errors."""
+    await uninitialized_client.initialize_session(
+        lsp.InitializeParams(
+            capabilities=lsp.ClientCapabilities(),
+            initialization_options={"maxDocumentBytes": 4},
+        )
+    )
+    uninitialized_client.text_document_did_open(
+        lsp.DidOpenTextDocumentParams(
+            text_document=lsp.TextDocumentItem(
+                uri="dummy_uri", language_id="spinasm", version=1, text="SOF 0, a\n"
+            )
+        )
+    )
+    await uninitialized_client.wait_for_notification(
+        lsp.TEXT_DOCUMENT_PUBLISH_DIAGNOSTICS
+    )
+
+    # The undefined symbol isn't reported, since symbols aren't resolved
+    assert uninitialized_client.diagnostics["dummy_uri"] == [
+        lsp.Diagnostic(
+            range=lsp.Range(start=lsp.Position(0, 0), end=lsp.Position(0, 0)),
+            message="File is larger than 4 bytes, so only basic highlighting is "
+            "available.",
+            severity=lsp.DiagnosticSeverity.Warning,
+            source="SPINAsm",
+        )
+    ]
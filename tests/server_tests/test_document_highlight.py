@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import lsprotocol.types as lsp
+import pytest
+from pytest_lsp import LanguageClient
+
+from ..conftest import PATCH_DIR, TestCase, parametrize_cases
+
+
+@dataclass
+class DocumentHighlightTestCase(TestCase):
+    """A dictionary to record document highlights for a symbol."""
+
+    position: lsp.Position
+    highlights: list[lsp.DocumentHighlight]
+    uri: str
+
+
+TEST_CASES: list[DocumentHighlightTestCase] = [
+    DocumentHighlightTestCase(
+        name="ap1",
+        position=lsp.Position(line=52, character=6),
+        uri=f"file:///{PATCH_DIR / 'Basic.spn'}",
+        highlights=[
+            lsp.DocumentHighlight(
+                range=lsp.Range(start=lsp.Position(8, 4), end=lsp.Position(8, 7)),
+                kind=lsp.DocumentHighlightKind.Write,
+            ),
+            # This symbol is `ap1#`, and should be highlighted including the modifier
+            lsp.DocumentHighlight(
+                range=lsp.Range(start=lsp.Position(51, 4), end=lsp.Position(51, 8)),
+                kind=lsp.DocumentHighlightKind.Read,
+            ),
+            lsp.DocumentHighlight(
+                range=lsp.Range(start=lsp.Position(52, 5), end=lsp.Position(52, 8)),
+                kind=lsp.DocumentHighlightKind.Read,
+            ),
+        ],
+    ),
+    DocumentHighlightTestCase(
+        name="endclr",
+        position=lsp.Position(line=37, character=10),
+        uri=f"file:///{PATCH_DIR / 'Basic.spn'}",
+        highlights=[
+            lsp.DocumentHighlight(
+                range=lsp.Range(start=lsp.Position(37, 8), end=lsp.Position(37, 14)),
+                kind=lsp.DocumentHighlightKind.Read,
+            ),
+            lsp.DocumentHighlight(
+                range=lsp.Range(start=lsp.Position(41, 0), end=lsp.Position(41, 6)),
+                kind=lsp.DocumentHighlightKind.Write,
+            ),
+        ],
+    ),
+    DocumentHighlightTestCase(
+        name="mem",
+        position=lsp.Position(line=8, character=0),
+        uri=f"file:///{PATCH_DIR / 'Basic.spn'}",
+        highlights=[],
+    ),
+]
+
+
+@parametrize_cases(TEST_CASES)
+@pytest.mark.asyncio()
+async def test_document_highlight(
+    test_case: DocumentHighlightTestCase, client: LanguageClient
+):
+    """Test that all occurrences of a symbol are highlighted."""
+    result = await client.text_document_document_highlight_async(
+        params=lsp.DocumentHighlightParams(
+            position=test_case.position,
+            text_document=lsp.TextDocumentIdentifier(uri=test_case.uri),
+        )
+    )
+
+    assert result == test_case.highlights
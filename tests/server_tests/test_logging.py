@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+
+import lsprotocol.types as lsp
+import pytest
+from pytest_lsp import LanguageClient
+
+
+async def debug_messages(client: LanguageClient) -> list[lsp.LogMessageParams]:
+    """Request a memory report, which is logged at the debug level."""
+    await client.workspace_execute_command_async(
+        lsp.ExecuteCommandParams(command="spinasm.memoryReport")
+    )
+    # Logged messages are flushed after the response is sent
+    await asyncio.sleep(0.2)
+
+    return [m for m in client.log_messages if m.type == lsp.MessageType.Log]
+
+
+@pytest.mark.asyncio()
+async def test_debug_messages_hidden_by_default(uninitialized_client: LanguageClient):
+    """Test that debug messages aren't sent unless requested."""
+    await uninitialized_client.initialize_session(
+        lsp.InitializeParams(capabilities=lsp.ClientCapabilities())
+    )
+
+    assert await debug_messages(uninitialized_client) == []
+
+
+@pytest.mark.asyncio()
+async def test_debug_messages_with_log_level(uninitialized_client: LanguageClient):
+    """Test that the log level initialization option enables debug messages."""
+    await uninitialized_client.initialize_session(
+        lsp.InitializeParams(
+            capabilities=lsp.ClientCapabilities(),
+            initialization_options={"logLevel": "debug"},
+        )
+    )
+
+    assert len(await debug_messages(uninitialized_client)) == 1
+
+
+@pytest.mark.asyncio()
+async def test_debug_messages_with_verbose_trace(uninitialized_client: LanguageClient):
+    """Test that setting a verbose trace enables debug messages."""
+    await uninitialized_client.initialize_session(
+        lsp.InitializeParams(capabilities=lsp.ClientCapabilities())
+    )
+    uninitialized_client.set_trace(lsp.SetTraceParams(value=lsp.TraceValues.Verbose))
+
+    assert len(await debug_messages(uninitialized_client)) == 1
+
+
+@pytest.mark.asyncio()
+async def test_log_level_silences_info(uninitialized_client: LanguageClient):
+    """Test that a stricter log level drops info messages."""
+    await uninitialized_client.initialize_session(
+        lsp.InitializeParams(
+            capabilities=lsp.ClientCapabilities(),
+            initialization_options={"logLevel": "warning"},
+        )
+    )
+    uninitialized_client.text_document_did_open(
+        lsp.DidOpenTextDocumentParams(
+            text_document=lsp.TextDocumentItem(
+                uri="dummy_uri", language_id="spinasm", version=1, text="sof 0,0\n"
+            )
+        )
+    )
+
+    # Renaming an opcode is refused with an info message
+    await uninitialized_client.text_document_prepare_rename_async(
+        lsp.PrepareRenameParams(
+            text_document=lsp.TextDocumentIdentifier(uri="dummy_uri"),
+            position=lsp.Position(line=0, character=1),
+        )
+    )
+    await asyncio.sleep(0.2)
+
+    assert uninitialized_client.log_messages == []
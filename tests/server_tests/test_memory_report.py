@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import lsprotocol.types as lsp
+import pytest
+from pytest_lsp import LanguageClient
+
+
+async def get_memory_report(client: LanguageClient) -> dict:
+    return await client.workspace_execute_command_async(
+        lsp.ExecuteCommandParams(command="spinasm.memoryReport")
+    )
+
+
+@pytest.mark.asyncio()
+async def test_closed_documents_are_evicted(client: LanguageClient):
+    """Test that cached document state is reported while open and released on close."""
+    test_uri = "dummy_uri"
+
+    client.text_document_did_open(
+        lsp.DidOpenTextDocumentParams(
+            text_document=lsp.TextDocumentItem(
+                uri=test_uri,
+                language_id="spinasm",
+                version=1,
+                text="Delay MEM 100\nsof 0,0\n",
+            )
+        )
+    )
+    await client.wait_for_notification(lsp.TEXT_DOCUMENT_PUBLISH_DIAGNOSTICS)
+
+    report = await get_memory_report(client)
+    assert test_uri in report
+    assert report[test_uri]["tokens"] == 7
+    assert report[test_uri]["parser"] > 0
+
+    client.text_document_did_close(
+        lsp.DidCloseTextDocumentParams(
+            text_document=lsp.TextDocumentIdentifier(uri=test_uri)
+        )
+    )
+
+    report = await get_memory_report(client)
+    assert test_uri not in report
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import lsprotocol.types as lsp
+import pytest
+from pytest_lsp import LanguageClient
+
+from ..conftest import TestCase, parametrize_cases
+
+
+@dataclass
+class PositionEncodingTestCase(TestCase):
+    """A dictionary to record the negotiated encoding for client encodings."""
+
+    client_encodings: list[lsp.PositionEncodingKind] | None
+    expected: lsp.PositionEncodingKind
+    sof_character: int
+
+
+TEST_CASES: list[PositionEncodingTestCase] = [
+    PositionEncodingTestCase(
+        name="unspecified",
+        client_encodings=None,
+        expected=lsp.PositionEncodingKind.Utf16,
+        sof_character=3,
+    ),
+    PositionEncodingTestCase(
+        name="utf-16 only",
+        client_encodings=[lsp.PositionEncodingKind.Utf16],
+        expected=lsp.PositionEncodingKind.Utf16,
+        sof_character=3,
+    ),
+    PositionEncodingTestCase(
+        name="utf-32 preferred",
+        client_encodings=[
+            lsp.PositionEncodingKind.Utf16,
+            lsp.PositionEncodingKind.Utf32,
+        ],
+        expected=lsp.PositionEncodingKind.Utf32,
+        sof_character=2,
+    ),
+]
+
+
+@parametrize_cases(TEST_CASES)
+@pytest.mark.asyncio()
+async def test_position_encoding(
+    test_case: PositionEncodingTestCase, uninitialized_client: LanguageClient
+):
+    """Test that the position encoding is negotiated and used for positions."""
+    capabilities = lsp.ClientCapabilities(
+        general=lsp.GeneralClientCapabilities(
+            position_encodings=test_case.client_encodings
+        )
+    )
+    result = await uninitialized_client.initialize_session(
+        lsp.InitializeParams(capabilities=capabilities)
+    )
+    assert result.capabilities.position_encoding == test_case.expected
+
+    # The emoji occupies two UTF-16 code units but only one UTF-32 code unit
+    test_uri = "dummy_uri"
+    uninitialized_client.text_document_did_open(
+        lsp.DidOpenTextDocumentParams(
+            text_document=lsp.TextDocumentItem(
+                uri=test_uri,
+                language_id="spinasm",
+                version=1,
+                text="\U0001f60b sof 0,0\n",
+            )
+        )
+    )
+
+    hover = await uninitialized_client.text_document_hover_async(
+        lsp.HoverParams(
+            text_document=lsp.TextDocumentIdentifier(uri=test_uri),
+            position=lsp.Position(line=0, character=test_case.sof_character),
+        )
+    )
+    assert hover is not None
+    assert hover.range.start.character == test_case.sof_character
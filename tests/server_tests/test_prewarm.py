@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+
+import lsprotocol.types as lsp
+import pytest
+from pytest_lsp import LanguageClient
+
+from ..conftest import PATCH_DIR, TEST_PATCHES
+
+
+def initialize_params(prewarm: bool) -> lsp.InitializeParams:
+    """Build parameters for a client that supports progress in the patch folder."""
+    return lsp.InitializeParams(
+        capabilities=lsp.ClientCapabilities(
+            window=lsp.WindowClientCapabilities(work_done_progress=True)
+        ),
+        root_uri=PATCH_DIR.as_uri(),
+        initialization_options={"prewarmWorkspace": prewarm},
+    )
+
+
+async def wait_for_progress_end(client: LanguageClient) -> list:
+    """Wait until a progress report has ended and return its updates."""
+
+    async def poll():
+        while True:
+            for updates in client.progress_reports.values():
+                if updates and isinstance(updates[-1], lsp.WorkDoneProgressEnd):
+                    return updates
+            await asyncio.sleep(0.05)
+
+    return await asyncio.wait_for(poll(), timeout=60)
+
+
+@pytest.mark.asyncio()
+async def test_prewarm_reports_progress(uninitialized_client: LanguageClient):
+    """Test that pre-warming parses every patch in the workspace with progress."""
+    await uninitialized_client.initialize_session(initialize_params(prewarm=True))
+
+    begin, *reports, end = await wait_for_progress_end(uninitialized_client)
+
+    assert isinstance(begin, lsp.WorkDoneProgressBegin)
+    assert sorted(r.message for r in reports) == sorted(p.name for p in TEST_PATCHES)
+    assert end.message == f"Parsed {len(TEST_PATCHES)} of {len(TEST_PATCHES)} patches"
+
+
+@pytest.mark.asyncio()
+async def test_prewarm_disabled_by_default(uninitialized_client: LanguageClient):
+    """Test that the workspace isn't parsed unless pre-warming is requested."""
+    await uninitialized_client.initialize_session(initialize_params(prewarm=False))
+    await asyncio.sleep(0.5)
+
+    assert uninitialized_client.progress_reports == {}
@@ -67,3 +67,21 @@ async def test_symbol_definitions(
     item = matching[0]
     assert item.kind == test_case.kind
     assert item.range == test_case.range
+
+
+@pytest.mark.asyncio()
+async def test_symbol_definitions_are_unique(client: LanguageClient):
+    """Test that each symbol is returned once, regardless of how often it is used."""
+    result = await client.text_document_document_symbol_async(
+        params=lsp.DocumentSymbolParams(
+            text_document=lsp.TextDocumentIdentifier(
+                uri=f"file:///{PATCH_DIR / 'Basic.spn'}"
+            ),
+        )
+    )
+
+    names = [item.name for item in result]
+    assert len(names) == len(set(names))
+    assert [item.range.start for item in result] == sorted(
+        (item.range.start for item in result), key=lambda p: (p.line, p.character)
+    )
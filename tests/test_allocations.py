@@ -0,0 +1,108 @@
+"""Test that each stage of parsing stays within its allocation ceilings."""
+
+from __future__ import annotations
+
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable
+
+import pytest
+
+from spinasm_lsp.parser import SPINAsmParser
+from spinasm_lsp.tokens import LSPToken, TokenLookup
+
+from .benchmarks.conftest import synthetic_program
+from .conftest import TEST_PATCHES
+
+PROGRAMS = {
+    **{patch.stem: patch.read_text(encoding="utf-8") for patch in TEST_PATCHES},
+    "synthetic_100": synthetic_program(100),
+}
+
+
+@dataclass
+class Allocations:
+    """Memory allocated by a function, traced with tracemalloc."""
+
+    blocks: float
+    """The number of memory blocks allocated and still retained afterwards."""
+
+    size: float
+    """The size of retained memory blocks, in bytes."""
+
+    peak: float
+    """The peak size of traced memory while the function ran, in bytes."""
+
+
+# The most memory that each stage may allocate per evaluated token. These are about
+# 1.5x the measurements when they were set, to allow for differences between Python
+# versions.
+CEILINGS: dict[str, Allocations] = {
+    "parser": Allocations(blocks=16, size=1200, peak=1500),
+    "token_lookup": Allocations(blocks=2, size=150, peak=150),
+    "evaluate_tokens": Allocations(blocks=6, size=450, peak=500),
+    "encode_semantics": Allocations(blocks=1, size=150, peak=150),
+}
+
+
+def trace_allocations(func: Callable[[], object]) -> Allocations:
+    """Trace the memory allocated by a function, keeping its result alive."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        start_size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        result = func()
+
+        size, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    del result
+    return Allocations(blocks=blocks, size=size - start_size, peak=peak - start_size)
+
+
+def populate_lookup(tokens: list[LSPToken]) -> TokenLookup[LSPToken]:
+    lookup: TokenLookup[LSPToken] = TokenLookup()
+    for token in tokens:
+        lookup.add_token(token)
+    return lookup
+
+
+def allocations_per_token(source: str) -> tuple[int, dict[str, Allocations]]:
+    """Trace each parsing stage for a program, per evaluated token."""
+    # An uncompacted parser keeps the intermediate state needed to rerun each stage
+    parser = SPINAsmParser(source, compact=False)
+    tokens = list(parser.evaluated_tokens)
+    n_tokens = len(tokens)
+
+    stages = {
+        "parser": trace_allocations(lambda: SPINAsmParser(source)),
+        "token_lookup": trace_allocations(lambda: populate_lookup(tokens)),
+        "evaluate_tokens": trace_allocations(parser._evaluate_tokens),
+        "encode_semantics": trace_allocations(parser._encode_semantics),
+    }
+
+    return n_tokens, {
+        stage: Allocations(
+            blocks=allocations.blocks / n_tokens,
+            size=allocations.size / n_tokens,
+            peak=allocations.peak / n_tokens,
+        )
+        for stage, allocations in stages.items()
+    }
+
+
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_allocations_per_token(name: str):
+    """Test that each parsing stage stays within its allocation ceilings."""
+    _, stages = allocations_per_token(PROGRAMS[name])
+
+    for stage, per_token in stages.items():
+        ceiling = CEILINGS[stage]
+        assert per_token.blocks <= ceiling.blocks, stage
+        assert per_token.size <= ceiling.size, stage
+        assert per_token.peak <= ceiling.peak, stage
@@ -0,0 +1,261 @@
+"""Test the coordination of parsing for individual documents."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from spinasm_lsp.documents import DocumentActor, _line_map, _only_comments_changed
+from spinasm_lsp.parser import ParseLimits, SPINAsmParser
+from spinasm_lsp.scheduler import Priority
+
+from .conftest import TEST_PATCHES
+
+
+class FakeParse:
+    """A parse function that records calls and waits until each source is released."""
+
+    def __init__(self):
+        self.calls: list[str] = []
+        self.cancelled: list[str] = []
+        self.released: dict[str, asyncio.Event] = {}
+        self.limits: ParseLimits | None = None
+
+    def release(self, source: str) -> None:
+        self.released.setdefault(source, asyncio.Event()).set()
+
+    async def __call__(
+        self, source: str, priority: Priority, cancelled: threading.Event
+    ) -> SPINAsmParser:
+        self.calls.append(source)
+        try:
+            await self.released.setdefault(source, asyncio.Event()).wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(source)
+            raise
+        return SPINAsmParser(source, limits=self.limits)
+
+
+@pytest.fixture()
+def parse() -> FakeParse:
+    return FakeParse()
+
+
+@pytest.fixture()
+def updates() -> list[SPINAsmParser]:
+    return []
+
+
+@pytest.fixture()
+def actor(parse, updates) -> DocumentActor:
+    return DocumentActor(parse=parse, on_update=updates.append, on_error=print)
+
+
+@pytest.mark.asyncio()
+async def test_identical_parses_are_shared(actor, parse, updates):
+    """Test that concurrent requests for the same version share one parse."""
+    requests = [
+        asyncio.ensure_future(actor.get("sof 0,0", 1, Priority.INTERACTIVE))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    parse.release("sof 0,0")
+
+    parsers = await asyncio.gather(*requests)
+    assert parse.calls == ["sof 0,0"]
+    assert all(p is parsers[0] for p in parsers)
+    assert updates == [parsers[0]]
+    assert actor.snapshot.version == 1
+
+
+@pytest.mark.asyncio()
+async def test_superseded_versions_are_abandoned(actor, parse, updates):
+    """Test that versions without requests are abandoned when a newer one arrives."""
+    actor.update("sof 0,0", 1, Priority.DIAGNOSTICS)
+    await asyncio.sleep(0)
+    actor.update("sof 0,1", 2, Priority.DIAGNOSTICS)
+    actor.update("sof 0,2", 3, Priority.DIAGNOSTICS)
+
+    parse.release("sof 0,2")
+    parser = await actor.get("sof 0,2", 3, Priority.INTERACTIVE)
+
+    assert parse.calls == ["sof 0,0", "sof 0,2"]
+    assert parse.cancelled == ["sof 0,0"]
+    assert updates == [parser]
+
+
+@pytest.mark.asyncio()
+async def test_requests_get_their_version(actor, parse, updates):
+    """Test that a request gets the version it was issued against, in order."""
+    old = asyncio.ensure_future(actor.get("sof 0,0", 1, Priority.INTERACTIVE))
+    await asyncio.sleep(0)
+    actor.update("sof 0,1", 2, Priority.DIAGNOSTICS)
+
+    # Versions are parsed in order, so the newer version waits for the older one
+    parse.release("sof 0,1")
+    await asyncio.sleep(0.01)
+    assert parse.calls == ["sof 0,0"]
+
+    parse.release("sof 0,0")
+    old_parser = await old
+    new_parser = await actor.get("sof 0,1", 2, Priority.INTERACTIVE)
+
+    assert old_parser is not new_parser
+    assert updates == [old_parser, new_parser]
+    assert actor.snapshot.version == 2
+
+
+@pytest.mark.asyncio()
+async def test_closed_documents_are_not_updated(actor, parse, updates):
+    """Test that closing a document abandons pending parses."""
+    actor.update("sof 0,0", 1, Priority.DIAGNOSTICS)
+    await asyncio.sleep(0)
+    actor.close()
+    await asyncio.sleep(0)
+
+    assert parse.cancelled == ["sof 0,0"]
+    assert updates == []
+    assert actor.snapshot is None
+
+
+@pytest.mark.asyncio()
+async def test_comment_edits_reuse_parse(actor, parse, updates):
+    """Test that editing only comments and trailing whitespace skips parsing."""
+    parse.release("sof 0,0 ; gain")
+    old_parser = await actor.get("sof 0,0 ; gain", 1, Priority.INTERACTIVE)
+    new_parser = await actor.get("sof 0,0  ; no gain  ", 2, Priority.INTERACTIVE)
+
+    assert new_parser is old_parser
+    assert parse.calls == ["sof 0,0 ; gain"]
+    assert actor.snapshot.version == 2
+    assert actor.snapshot.source == "sof 0,0  ; no gain  "
+
+
+@pytest.mark.asyncio()
+async def test_blank_line_edits_move_parse(actor, parse, updates):
+    """Test that inserting and deleting lines without code moves the last parse."""
+    parse.release("sof 0,0\n\nsof 0,1")
+    old_parser = await actor.get("sof 0,0\n\nsof 0,1", 1, Priority.INTERACTIVE)
+    new_parser = await actor.get("; gain\nsof 0,0\nsof 0,1", 2, Priority.INTERACTIVE)
+
+    assert parse.calls == ["sof 0,0\n\nsof 0,1"]
+    assert new_parser is not old_parser
+    assert [t.range.start.line for t in new_parser.evaluated_tokens] == [
+        1,
+        1,
+        1,
+        1,
+        2,
+        2,
+        2,
+        2,
+    ]
+    assert actor.snapshot.parser is new_parser
+
+
+@pytest.mark.asyncio()
+async def test_comment_edits_redo_degraded_parse(actor, parse, updates):
+    """Test that trimming a comment re-checks a document that was too large."""
+    parse.limits = ParseLimits(max_bytes=20)
+    long_source = "sof 0,0 ; a long comment"
+    short_source = "sof 0,0 ; short"
+    parse.release(long_source)
+    parse.release(short_source)
+
+    old_parser = await actor.get(long_source, 1, Priority.INTERACTIVE)
+    new_parser = await actor.get(short_source, 2, Priority.INTERACTIVE)
+
+    assert old_parser.degraded is not None
+    assert new_parser.degraded is None
+    assert parse.calls == [long_source, short_source]
+
+
+@pytest.mark.parametrize(
+    ("old", "new"),
+    [
+        ("sof 0,0", "sof 0,1"),
+        ("sof 0,0", " sof 0,0"),
+        ("sof 0,0", "sof 0,0\n"),
+        ("; sof 0,0", "sof 0,0"),
+        ("equ a 'x;y'", "equ a 'x;z'"),
+    ],
+)
+def test_code_edits_are_not_comment_edits(old, new):
+    """Test that edits that may change tokens or their positions are detected."""
+    assert not _only_comments_changed(old, new)
+
+
+@pytest.mark.parametrize("patch", TEST_PATCHES, ids=lambda x: x.stem)
+def test_comment_edits_parse_identically(patch):
+    """Test that editing comments in real patches doesn't change the parse."""
+    source = patch.read_text()
+    edited = "\n".join(
+        f"{line} edited" if ";" in line else f"{line}  " for line in source.split("\n")
+    )
+    assert _only_comments_changed(source, edited)
+
+    old, new = SPINAsmParser(source), SPINAsmParser(edited)
+    assert new.diagnostics == old.diagnostics
+    assert list(new.semantic_encoding) == list(old.semantic_encoding)
+    assert [t.range for t in new.evaluated_tokens] == [
+        t.range for t in old.evaluated_tokens
+    ]
+
+
+def _token_summary(parser: SPINAsmParser, lines: int) -> list:
+    """Summarize the tokens and lookups of a parser on each line."""
+    summary = []
+    for line in range(lines):
+        tokens = parser.evaluated_tokens.get(line=line)
+        summary.append(
+            (
+                [(t.stxt, t.range) for t in tokens],
+                [
+                    parser.evaluated_tokens.get(position=t.range.start).range
+                    for t in tokens
+                ],
+                [parser.symbol_references.get(t.stxt) for t in tokens],
+                [
+                    (args.opcode.stxt, args.opcode.range, args.separators)
+                    for args in parser.opcode_arguments.get(line, [])
+                ],
+            )
+        )
+    return summary
+
+
+@pytest.mark.parametrize("patch", TEST_PATCHES, ids=lambda x: x.stem)
+def test_moved_parses_match_new_parses(patch):
+    """Test that moving a parse to inserted and deleted lines matches re-parsing."""
+    source = patch.read_text()
+    # Insert lines at the start and after every 7th line, and delete some blank lines
+    edited = ["; inserted", ""]
+    for i, line in enumerate(source.split("\n")):
+        if line.strip() or i % 3:
+            edited.append(line)
+        if i % 7 == 0:
+            edited += ["", "\t; inserted"]
+    # Then delete the lines inserted at the start and insert more in the middle
+    middle = len(edited) // 2
+    twice = [*edited[2:middle], "", "", *edited[middle:]]
+
+    parser = SPINAsmParser(source)
+    for old_source, new_source in [
+        (source, "\n".join(edited)),
+        ("\n".join(edited), "\n".join(twice)),
+    ]:
+        line_map = _line_map(old_source, new_source)
+        assert line_map
+        parser = parser.moved(line_map)
+
+        new = SPINAsmParser(new_source)
+        lines = new_source.count("\n") + 1
+        assert parser.diagnostics == new.diagnostics
+        assert list(parser.semantic_encoding) == list(new.semantic_encoding)
+        assert parser.document_symbols == new.document_symbols
+        assert [(t.stxt, t.range) for t in parser.evaluated_tokens] == [
+            (t.stxt, t.range) for t in new.evaluated_tokens
+        ]
+        assert _token_summary(parser, lines) == _token_summary(new, lines)
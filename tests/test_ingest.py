@@ -0,0 +1,68 @@
+"""Test bulk reading of patch files."""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from spinasm_lsp import ingest
+from spinasm_lsp.parser import SPINAsmParser
+
+from .conftest import TEST_PATCHES
+
+
+@pytest.mark.parametrize("size", [10, ingest.MMAP_THRESHOLD + 10], ids=["read", "mmap"])
+def test_read_source_preserves_line_endings(tmp_path, size):
+    """Test that sources are read the same way with and without memory-mapping."""
+    text = ("sof 0,0\r\n" * (size // 9 + 1)) + "wrax dacl,0\n\xe9"
+    path = tmp_path / "patch.spn"
+    path.write_bytes(text.encode("utf-8"))
+
+    assert ingest.read_source(path) == text
+    assert ingest.read_lines(path) == text.split("\n")
+
+
+def test_read_source_replaces_undecodable_bytes(tmp_path):
+    """Test that bytes that aren't valid UTF-8 don't prevent reading."""
+    path = tmp_path / "patch.spn"
+    path.write_bytes(b"; caf\xe9\nsof 0,0\n")
+
+    assert ingest.read_lines(path) == ["; caf�", "sof 0,0", ""]
+
+
+def test_read_many_skips_unreadable_files(tmp_path):
+    """Test that missing files are skipped when reading in bulk."""
+    paths = [TEST_PATCHES[0], tmp_path / "missing.spn"]
+    assert [path for path, _ in ingest.read_many(paths)] == [TEST_PATCHES[0]]
+
+
+@pytest.mark.parametrize("patch", TEST_PATCHES, ids=lambda x: x.stem)
+def test_parsing_lines_matches_source(patch):
+    """Test that parsing pre-split lines gives the same results as the source."""
+    with open(patch, encoding="utf-8", newline="") as f:
+        expected = SPINAsmParser(f.read())
+
+    [(_, parser)] = ingest.parse_many([patch])
+
+    assert [t.stxt for t in parser.evaluated_tokens] == [
+        t.stxt for t in expected.evaluated_tokens
+    ]
+    assert [t.range for t in parser.evaluated_tokens] == [
+        t.range for t in expected.evaluated_tokens
+    ]
+    assert parser.semantic_encoding == expected.semantic_encoding
+    assert parser.diagnostics == expected.diagnostics
+
+
+def test_diagnose_many_in_processes(tmp_path):
+    """Test that diagnosing patches in worker processes matches parsing them here."""
+    paths = [*TEST_PATCHES, tmp_path / "missing.spn"]
+    expected = [
+        (patch, SPINAsmParser(patch.read_text(encoding="utf-8")).diagnostics)
+        for patch in TEST_PATCHES
+    ]
+
+    with ProcessPoolExecutor(2) as executor:
+        assert list(ingest.diagnose_many(paths, executor=executor)) == expected
+    assert list(ingest.diagnose_many(paths)) == expected
@@ -0,0 +1,88 @@
+"""Test the mapping of lines as lines without code are inserted and deleted."""
+
+from __future__ import annotations
+
+import lsprotocol.types as lsp
+import pytest
+
+from spinasm_lsp.documents import _line_map
+from spinasm_lsp.lines import LineMap
+
+
+def test_adjacent_runs_are_merged():
+    """Test that runs that continue each other at the same offset are combined."""
+    lines = LineMap([(0, 0, 2), (2, 2, 3), (6, 8, 1), (7, 9, 2)])
+    assert lines.runs == ((0, 0, 5), (6, 8, 3))
+
+
+def test_map_lines():
+    """Test mapping kept, deleted, and inserted lines in both directions."""
+    # Line 2 was deleted and two lines were inserted before line 4
+    lines = LineMap([(0, 0, 2), (3, 2, 1), (4, 5, 2)])
+
+    assert [lines.to_current(line) for line in (0, 1, 3, 4, 5)] == [0, 1, 2, 5, 6]
+    assert [lines.to_original(line) for line in range(7)] == [0, 1, 3, None, None, 4, 5]
+    assert lines.to_original(7) is None
+
+
+def test_move_range():
+    """Test that ranges move with the line they start on."""
+    lines = LineMap([(0, 0, 2), (2, 4, 2)])
+    range = lsp.Range(start=lsp.Position(2, 3), end=lsp.Position(3, 1))
+
+    assert lines.move_range(range) == lsp.Range(
+        start=lsp.Position(4, 3), end=lsp.Position(5, 1)
+    )
+    unmoved = lsp.Range(start=lsp.Position(1, 0), end=lsp.Position(2, 0))
+    assert lines.move_range(unmoved) is unmoved
+
+
+def test_unmoved_map_is_false():
+    """Test that a map is only true if some line moved."""
+    assert not LineMap([(0, 0, 3), (4, 4, 2)])
+    assert LineMap([(0, 0, 3), (4, 5, 2)])
+
+
+@pytest.mark.parametrize(
+    ("old", "new"),
+    [
+        ("sof 0,0", "sof 0,1"),
+        ("sof 0,0\nsof 0,0", "sof 0,0"),
+        ("equ a 'x'\nsof 0,0", "equ a 'x' ; b\nsof 0,0"),
+    ],
+)
+def test_code_edits_are_not_mapped(old, new):
+    """Test that lines aren't mapped between sources with different code."""
+    assert _line_map(old, new) is None
+
+
+def test_map_inserted_and_deleted_lines():
+    """Test mapping the lines with code around inserted and deleted lines."""
+    old = "; header\n\nsof 0,0\n\n\nsof 0,1 ; gain\nsof 0,2"
+    new = "; header\n\n\n\nsof 0,0\nsof 0,1 ; no gain\n\nsof 0,2"
+    lines = _line_map(old, new)
+
+    assert lines is not None
+    assert [lines.to_current(line) for line in (2, 5, 6)] == [4, 5, 7]
+    assert [lines.to_original(line) for line in (4, 5, 7)] == [2, 5, 6]
+
+
+def test_combined_maps_match_direct_map():
+    """Test that combining the maps of successive edits maps the same code lines."""
+    sources = [
+        "sof 0,0\n\nsof 0,1\nsof 0,2\n\n\nsof 0,3",
+        "\nsof 0,0\nsof 0,1\n\n\nsof 0,2\n\n\nsof 0,3\n",
+        "\nsof 0,0\n; a\n; b\nsof 0,1\n\nsof 0,2\nsof 0,3\n\n\n",
+        "sof 0,0\nsof 0,1\n\n\n\nsof 0,2\n\nsof 0,3",
+    ]
+    combined = _line_map(sources[0], sources[1])
+    for old, new in zip(sources[1:], sources[2:]):
+        combined = combined.then(_line_map(old, new))
+
+    direct = _line_map(sources[0], sources[-1])
+    code_lines = [i for i, line in enumerate(sources[0].split("\n")) if line]
+    assert [combined.to_current(line) for line in code_lines] == [
+        direct.to_current(line) for line in code_lines
+    ]
+    assert [combined.to_current(line) for line in code_lines] == [0, 1, 5, 7]
+    assert [combined.to_original(line) for line in (0, 1, 5, 7)] == code_lines
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import lsprotocol.types as lsp
+import pytest
+
+from spinasm_lsp.logs import MessageLog
+
+
+class StubServer:
+    """A server that records the messages it would send."""
+
+    def __init__(self, trace: lsp.TraceValues = lsp.TraceValues.Off):
+        self.lsp = SimpleNamespace(trace=trace)
+        self.loop = asyncio.new_event_loop()
+        self.sent: list[tuple[str, lsp.MessageType]] = []
+
+    def show_message_log(self, message: str, msg_type: lsp.MessageType) -> None:
+        self.sent.append((message, msg_type))
+
+
+@pytest.fixture()
+def stub_server():
+    server = StubServer()
+    yield server
+    server.loop.close()
+
+
+class Unformattable:
+    def __str__(self) -> str:
+        raise AssertionError("Message was formatted")
+
+
+def test_disabled_messages_are_not_formatted(stub_server: StubServer):
+    """Test that messages below the level are dropped before formatting."""
+    log = MessageLog(stub_server)  # type: ignore[arg-type]
+    log.log(lsp.MessageType.Log, Unformattable())
+    log.log(lsp.MessageType.Log, "%s", Unformattable())
+    log.flush()
+
+    assert stub_server.sent == []
+
+
+def test_messages_are_batched_by_type(stub_server: StubServer):
+    """Test that consecutive messages of a type are sent together, in order."""
+    log = MessageLog(stub_server)  # type: ignore[arg-type]
+    log.set_level("debug")
+    log.log(lsp.MessageType.Info, "a")
+    log.log(lsp.MessageType.Info, "b %d", 1)
+    log.log(lsp.MessageType.Error, "c")
+    log.log(lsp.MessageType.Info, "100%")
+    assert stub_server.sent == []
+
+    log.flush()
+    assert stub_server.sent == [
+        ("a\nb 1", lsp.MessageType.Info),
+        ("c", lsp.MessageType.Error),
+        ("100%", lsp.MessageType.Info),
+    ]
+
+
+def test_level_follows_trace_unless_set(stub_server: StubServer):
+    """Test that verbose traces enable debug messages unless a level is set."""
+    log = MessageLog(stub_server)  # type: ignore[arg-type]
+    assert not log.enabled(lsp.MessageType.Log)
+    assert log.enabled(lsp.MessageType.Info)
+
+    stub_server.lsp.trace = lsp.TraceValues.Verbose
+    assert log.enabled(lsp.MessageType.Log)
+
+    log.set_level("error")
+    assert not log.enabled(lsp.MessageType.Warning)
+    assert log.enabled(lsp.MessageType.Error)
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from types import MappingProxyType
+
+import pytest
+
+from spinasm_lsp.memory import deep_sizeof
+from spinasm_lsp.parser import SPINAsmParser
+
+
+def test_read_only_containers_are_traversed():
+    """Test that mapping proxies and memory views count what they expose."""
+    values = list(range(1000))
+    assert deep_sizeof(MappingProxyType({"values": values})) > sys.getsizeof(values)
+
+    buffer = array("I", values)
+    assert deep_sizeof(memoryview(buffer).toreadonly()) > sys.getsizeof(buffer)
+
+
+@pytest.mark.parametrize("attr", [None, "evaluated_tokens", "semantic_encoding"])
+def test_size_grows_with_tokens(attr):
+    """Test that the estimated size of a parse scales with the number of tokens."""
+
+    def size(n_lines: int) -> int:
+        parser = SPINAsmParser("sof 0,0\n" * n_lines)
+        return deep_sizeof(parser if attr is None else getattr(parser, attr))
+
+    assert size(100) > 5 * size(10)
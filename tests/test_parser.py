@@ -3,12 +3,20 @@
 from __future__ import annotations
 
 import json
+import threading
 from pathlib import Path
 
 import jsonpickle
 import pytest
 
-from spinasm_lsp.parser import SPINAsmParser
+from spinasm_lsp.parser import (
+    DEFAULT_PARSE_LIMITS,
+    MAX_SCAN_ERRORS,
+    ParseLimits,
+    ParsingCancelled,
+    ScanCache,
+    SPINAsmParser,
+)
 
 from .conftest import TEST_PATCHES
 
@@ -27,8 +35,8 @@ def serialize_parser_output(parser: SPINAsmParser) -> dict:
     output_attrs = {
         # Check the list of tokens rather than the token lookup
         "evaluated_tokens": list(parser.evaluated_tokens),
-        "semantic_encoding": parser.semantic_encoding,
-        "diagnostics": parser.diagnostics,
+        "semantic_encoding": list(parser.semantic_encoding),
+        "diagnostics": list(parser.diagnostics),
     }
 
     return json.loads(jsonpickle.encode(output_attrs, make_refs=True))
@@ -69,3 +77,176 @@ def test_parsing_as_typed():
     for i in range(len(source_chars)):
         partial_source = "".join(source_chars[:i])
         assert SPINAsmParser(partial_source)
+
+
+def test_symbol_references():
+    """Test that symbol references are indexed with and without address modifiers."""
+    parser = SPINAsmParser("Delay MEM 100\nrda Delay#, 0.5\nwra Delay, 0\n")
+
+    references = parser.symbol_references["DELAY"]
+    assert parser.symbol_references["DELAY#"] is references
+    assert references.defined == references.ranges[0]
+    assert [r.start.line for r in references.ranges] == [0, 1, 2]
+    assert [r.end.character for r in references.ranges] == [5, 9, 9]
+    assert [r.end.character for r in references.full_ranges] == [5, 10, 9]
+
+
+def test_opcode_arguments():
+    """Test that argument separators are indexed by the opcode they follow."""
+    parser = SPINAsmParser("sof 0, 0\ncho rda, sin0, 0, 0\n")
+
+    sof = parser.opcode_arguments[0][0]
+    assert sof.opcode.stxt == "SOF"
+    assert sof.separators == (5,)
+    assert [sof.active_parameter(c) for c in (4, 5, 6)] == [0, 0, 1]
+
+    cho = parser.opcode_arguments[1][0]
+    assert cho.opcode.stxt == "CHO RDA"
+    assert cho.separators == (7, 13, 16)
+
+
+def test_cancelled_parsing():
+    """Test that parsing stops when the cancellation event is set."""
+    cancelled = threading.Event()
+    cancelled.set()
+
+    with pytest.raises(ParsingCancelled):
+        SPINAsmParser("sof 0,0\n", cancelled=cancelled)
+
+
+def test_parsed_results_are_immutable():
+    """Test that a finished parser can't be modified by the requests sharing it."""
+    parser = SPINAsmParser("Delay MEM 100\nrda Delay#, 0.5\nfoo\n")
+
+    with pytest.raises(RuntimeError):
+        parser.evaluated_tokens.add_token(parser.evaluated_tokens.get(line=0)[0])
+    with pytest.raises(TypeError):
+        parser.symbol_references["NEW"] = parser.symbol_references["DELAY"]  # type: ignore
+    with pytest.raises(TypeError):
+        parser.symtbl["NEW"] = 0  # type: ignore
+    with pytest.raises(TypeError):
+        parser.semantic_encoding[0] = 0  # type: ignore
+
+    assert isinstance(parser.diagnostics, tuple)
+    assert isinstance(parser.document_symbols, tuple)
+    assert isinstance(parser.evaluated_tokens.get(line=1), tuple)
+
+
+@pytest.mark.parametrize("patch", TEST_PATCHES, ids=lambda x: x.stem)
+def test_scan_cache_parses_identically(patch):
+    """Test that parsing with cached scans matches parsing without a cache."""
+    source = patch.read_text()
+    cache = ScanCache()
+    uncached = SPINAsmParser(source, scan_cache=None)
+
+    # The second parse is scanned entirely from the cache
+    for _ in range(2):
+        cached = SPINAsmParser(source, scan_cache=cache)
+        assert serialize_parser_output(cached) == serialize_parser_output(uncached)
+
+
+def test_scan_cache_counts_hits():
+    """Test that repeated lines are only scanned once."""
+    cache = ScanCache(max_size=2)
+    SPINAsmParser("sof 0,0\nsof 0,0\nclr\n", scan_cache=cache)
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    # The oldest line is evicted to make room for the empty last line
+    assert len(cache) == 2
+    assert cache.hit_rate == 0.25
+
+
+@pytest.mark.parametrize("patch", TEST_PATCHES, ids=lambda x: x.stem)
+def test_default_limits_parse_patches(patch):
+    """Test that the default limits don't degrade the example patches."""
+    parser = SPINAsmParser(patch.read_text(), limits=DEFAULT_PARSE_LIMITS)
+    assert parser.degraded is None
+
+
+@pytest.mark.parametrize(
+    ("limits", "reason"),
+    [
+        (ParseLimits(max_bytes=10), "File is larger than 10 bytes"),
+        (ParseLimits(max_tokens=10), "File has more than 10 tokens"),
+        (ParseLimits(time_budget=0), "Parsing took longer than 0 seconds"),
+    ],
+    ids=["bytes", "tokens", "time"],
+)
+def test_limits_degrade_to_scanning(limits, reason):
+    """Test that exceeding a limit scans tokens without resolving symbols."""
+    source = TEST_PATCHES[0].read_text()
+    parsed = SPINAsmParser(source)
+    scanned = SPINAsmParser(source, limits=limits)
+
+    assert scanned.degraded == reason
+    assert [d.message for d in scanned.diagnostics] == [
+        f"{reason}, so only basic highlighting is available."
+    ]
+    assert scanned.symbol_references == {}
+    assert scanned.document_symbols == ()
+
+    # Tokens are positioned the same way as parsed tokens, up to the token limit
+    scanned_ranges = [t.range for t in scanned.evaluated_tokens]
+    parsed_ranges = [t.range for t in parsed.evaluated_tokens]
+    assert scanned_ranges == parsed_ranges[: limits.max_tokens]
+
+
+@pytest.mark.parametrize(
+    "declaration", ["mem delay 10", "delay mem 10"], ids=["mem_first", "name_first"]
+)
+def test_scanning_recognizes_address_modifiers(declaration):
+    """Test that scanning accepts address modifiers on declared memory."""
+    source = f"{declaration}\nrda delay#, 0.5\nwra delay^, 0\n"
+    parser = SPINAsmParser(source, limits=ParseLimits(max_bytes=0))
+
+    assert len(parser.diagnostics) == 1
+    assert [t.stxt for t in parser.evaluated_tokens if t.type == "LABEL"] == [
+        "DELAY",
+        "DELAY#",
+        "DELAY^",
+    ]
+
+
+@pytest.mark.parametrize(
+    ("source", "limits", "reason"),
+    [
+        ("@\n" * 600_000, DEFAULT_PARSE_LIMITS, "File is larger than 1000000 bytes"),
+        ("@\n" * 1_000, ParseLimits(max_tokens=500), "File has more than 500 tokens"),
+        (
+            # Every line is skipped within a single call to the scanner
+            "@\n" * 100_000,
+            ParseLimits(max_tokens=None, time_budget=0.05),
+            "Parsing took longer than 0.05 seconds",
+        ),
+    ],
+    ids=["bytes", "tokens", "time"],
+)
+def test_garbage_input_is_bounded(source, limits, reason):
+    """Test that unrecognized input counts toward the limits and stops scanning."""
+    parser = SPINAsmParser(source, limits=limits)
+
+    assert parser.degraded == reason
+    assert len(parser.evaluated_tokens) == 0
+    # The warning that parsing was degraded, followed by the capped scan errors
+    assert len(parser.diagnostics) == MAX_SCAN_ERRORS + 1
+
+
+@pytest.mark.parametrize("scan_cache", [ScanCache(), None], ids=["cached", "uncached"])
+@pytest.mark.parametrize(
+    "limits", [ParseLimits(), ParseLimits(max_bytes=10)], ids=["parsed", "degraded"]
+)
+def test_unbalanced_quotes_are_skipped(scan_cache, limits):
+    """Test that lines that can't be split into words are reported and skipped."""
+    source = "00000010  27 00  |' ..|\nsof 0,0\n"
+    parser = SPINAsmParser(source, scan_cache=scan_cache, limits=limits)
+
+    unbalanced = [d for d in parser.diagnostics if d.message == "No closing quotation"]
+    assert [d.range.start.line for d in unbalanced] == [0]
+    assert [t.stxt for t in parser.evaluated_tokens] == ["SOF", "0", ",", "0"]
+
+
+def test_unbalanced_quotes_are_bounded():
+    """Test that lines that can't be split count toward the scan error limit."""
+    parser = SPINAsmParser("'\n" * 1_000, limits=ParseLimits(max_bytes=10))
+
+    assert len(parser.diagnostics) == MAX_SCAN_ERRORS + 1
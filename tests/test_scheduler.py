@@ -0,0 +1,94 @@
+"""Test the prioritized scheduling of blocking work."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from spinasm_lsp.scheduler import Priority, Scheduler
+
+
+@pytest.fixture()
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+async def wait_until(condition, timeout: float = 1.0) -> None:
+    """Wait for a condition to become true, yielding to the event loop."""
+
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.001)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.mark.asyncio()
+async def test_higher_priority_runs_first(executor):
+    """Test that pending interactive work starts before pending background work."""
+    scheduler = Scheduler(executor, max_workers=1)
+    release = threading.Event()
+    order = []
+
+    blocking = asyncio.ensure_future(scheduler.run(Priority.BACKGROUND, release.wait))
+    await wait_until(lambda: scheduler.running[Priority.BACKGROUND] == 1)
+
+    background = asyncio.ensure_future(
+        scheduler.run(Priority.BACKGROUND, order.append, "background")
+    )
+    interactive = asyncio.ensure_future(
+        scheduler.run(Priority.INTERACTIVE, order.append, "interactive")
+    )
+    await asyncio.sleep(0.01)
+    assert order == []
+
+    release.set()
+    await asyncio.gather(blocking, background, interactive)
+    assert order == ["interactive", "background"]
+
+
+@pytest.mark.asyncio()
+async def test_priority_limits(executor):
+    """Test that each priority is limited, without blocking other priorities."""
+    scheduler = Scheduler(executor, max_workers=4, limits={Priority.BACKGROUND: 1})
+    release = threading.Event()
+
+    background = [
+        asyncio.ensure_future(scheduler.run(Priority.BACKGROUND, release.wait))
+        for _ in range(3)
+    ]
+    await wait_until(lambda: scheduler.running[Priority.BACKGROUND] == 1)
+
+    result = await scheduler.run(Priority.INTERACTIVE, lambda: "done")
+    assert result == "done"
+    assert scheduler.running[Priority.BACKGROUND] == 1
+
+    release.set()
+    await asyncio.gather(*background)
+    assert sum(scheduler.running.values()) == 0
+
+
+@pytest.mark.asyncio()
+async def test_cancelled_work_releases_worker(executor):
+    """Test that cancelling pending work doesn't leak workers."""
+    scheduler = Scheduler(executor, max_workers=1)
+    release = threading.Event()
+
+    blocking = asyncio.ensure_future(scheduler.run(Priority.DIAGNOSTICS, release.wait))
+    await wait_until(lambda: scheduler.running[Priority.DIAGNOSTICS] == 1)
+
+    pending = asyncio.ensure_future(scheduler.run(Priority.INTERACTIVE, lambda: None))
+    await asyncio.sleep(0.01)
+    pending.cancel()
+
+    release.set()
+    await blocking
+    with pytest.raises(asyncio.CancelledError):
+        await pending
+
+    assert await scheduler.run(Priority.INTERACTIVE, lambda: 1) == 1
+    assert sum(scheduler.running.values()) == 0
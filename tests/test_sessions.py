@@ -0,0 +1,262 @@
+"""Test serving multiple clients from a single server process."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import json
+import socket
+import sys
+import threading
+
+import lsprotocol.types as lsp
+import pytest
+import pytest_asyncio
+
+from spinasm_lsp.parser import ParseLimits, SPINAsmParser
+from spinasm_lsp.scheduler import Priority
+from spinasm_lsp.server import server
+from spinasm_lsp.sessions import ParseCache
+
+
+class RawClient:
+    """A minimal JSON-RPC client for talking to a server over a socket."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._ids = itertools.count()
+
+    def send(self, method: str, params: dict, *, request: bool = False) -> int | None:
+        message: dict = {"jsonrpc": "2.0", "method": method, "params": params}
+        msg_id = next(self._ids) if request else None
+        if msg_id is not None:
+            message["id"] = msg_id
+
+        body = json.dumps(message).encode()
+        self.writer.write(f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        return msg_id
+
+    async def receive(self) -> dict:
+        length = 0
+        while (line := await self.reader.readline()) != b"\r\n":
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+
+        return json.loads(await self.reader.readexactly(length))
+
+    async def wait_for(self, method: str | None = None, msg_id: int | None = None):
+        """Wait for a notification with a method or a response with an ID."""
+        while True:
+            message = await self.receive()
+            if method is not None and message.get("method") == method:
+                return message["params"]
+            if msg_id is not None and message.get("id") == msg_id:
+                return message.get("result")
+
+    async def initialize(self) -> None:
+        msg_id = self.send(
+            "initialize", {"processId": None, "capabilities": {}}, request=True
+        )
+        await self.wait_for(msg_id=msg_id)
+        self.send("initialized", {})
+
+    def open(self, uri: str, text: str) -> None:
+        self.send(
+            "textDocument/didOpen",
+            {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": "spinasm",
+                    "version": 0,
+                    "text": text,
+                }
+            },
+        )
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def connect(port: int, attempts: int = 100) -> RawClient:
+    """Connect to a server, waiting for it to start listening."""
+    for _ in range(attempts):
+        with contextlib.suppress(OSError):
+            return RawClient(*await asyncio.open_connection("127.0.0.1", port))
+        await asyncio.sleep(0.1)
+
+    return RawClient(*await asyncio.open_connection("127.0.0.1", port))
+
+
+@pytest_asyncio.fixture()
+async def tcp_port():
+    """Start a server in TCP mode and return its port."""
+    port = get_free_port()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "spinasm_lsp.server", "--tcp", "--port", str(port)
+    )
+    yield port
+
+    process.terminate()
+    await process.wait()
+
+
+def test_parse_cache_drops_least_recently_used():
+    """Test that the parse cache is bounded and keeps recently used parsers."""
+    cache = ParseCache(max_size=2)
+    keys = [ParseCache.key(src, lsp.PositionEncodingKind.Utf16) for src in "abc"]
+    for key in keys[:2]:
+        cache.put(key, SPINAsmParser(""))
+
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], SPINAsmParser(""))
+
+    assert len(cache) == 2
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_parse_cache_keys_by_position_encoding():
+    """Test that identical sources parsed with different encodings aren't shared."""
+    utf16 = ParseCache.key("sof 0,0", lsp.PositionEncodingKind.Utf16)
+    utf32 = ParseCache.key("sof 0,0", lsp.PositionEncodingKind.Utf32)
+    assert utf16 != utf32
+
+
+def test_parse_cache_keys_by_limits():
+    """Test that identical sources parsed with different limits aren't shared."""
+    encoding = lsp.PositionEncodingKind.Utf16
+    default = ParseCache.key("sof 0,0", encoding, ParseLimits())
+    small = ParseCache.key("sof 0,0", encoding, ParseLimits(max_bytes=1))
+    assert default != small
+
+
+@pytest.mark.asyncio()
+async def test_parses_out_of_time_are_not_cached():
+    """Test that parses degraded by the time budget aren't shared."""
+    session = server.new_session()
+    session.parse_cache = ParseCache()
+
+    session.parse_limits = ParseLimits(time_budget=0)
+    parser = await session._parse("sof 0,0\n", Priority.BACKGROUND, threading.Event())
+    assert parser.degraded_limit == "time_budget"
+    assert len(session.parse_cache) == 0
+
+    # Other limits don't depend on the load, so those parses are shared
+    session.parse_limits = ParseLimits(max_bytes=1)
+    parser = await session._parse("sof 0,0\n", Priority.BACKGROUND, threading.Event())
+    assert parser.degraded_limit == "max_bytes"
+    assert len(session.parse_cache) == 1
+
+
+@pytest.mark.asyncio()
+async def test_superseded_versions_are_evicted_from_parse_cache():
+    """Test that the shared cache only holds the current version of open documents."""
+    uri = "file:///test.spn"
+    session = server.new_session()
+    session.parse_cache = ParseCache()
+    session._publish_if_changed = lambda uri, diagnostics: None  # type: ignore
+
+    for version, source in enumerate(["s", "so", "sof 0,0\n"]):
+        await session.get_document(uri).get(source, version, Priority.INTERACTIVE)
+    assert len(session.parse_cache) == 1
+    assert session.parse_cache.get(
+        ParseCache.key("sof 0,0\n", session.position_encoding, session.parse_limits)
+    )
+
+    session.evict(uri)
+    assert len(session.parse_cache) == 0
+
+
+@pytest.mark.asyncio()
+async def test_parse_cache_created_during_parse():
+    """Test that a cache created while parsing, e.g. by pre-warming, isn't used."""
+    session = server.new_session()
+    session.parse_cache = None
+
+    class CreateCacheScheduler:
+        async def run(self, priority, func, *args, **kwargs):
+            session.parse_cache = ParseCache()
+            return func(*args, **kwargs)
+
+    session.scheduler = CreateCacheScheduler()  # type: ignore
+    await session._parse("sof 0,0\n", Priority.INTERACTIVE, threading.Event())
+    assert len(session.parse_cache) == 0
+
+
+@pytest.mark.asyncio()
+async def test_comment_edits_keep_shared_parse_cached():
+    """Test that a parse reused for a comment edit stays cached for other sessions."""
+    uri = "file:///test.spn"
+    session = server.new_session()
+    session.parse_cache = ParseCache()
+    session._publish_if_changed = lambda uri, diagnostics: None  # type: ignore
+
+    document = session.get_document(uri)
+    parser = await document.get("sof 0,0\n", 0, Priority.INTERACTIVE)
+    assert await document.get("sof 0,0 ; gain\n", 1, Priority.INTERACTIVE) is parser
+
+    key = ParseCache.key("sof 0,0\n", session.position_encoding, session.parse_limits)
+    assert session.parse_cache.get(key) is parser
+
+    session.evict(uri)
+    assert len(session.parse_cache) == 0
+
+
+def test_sessions_share_caches_but_not_documents():
+    """Test that new sessions share parsers and workers, but not open documents."""
+    a = server.new_session()
+    b = server.new_session()
+
+    assert a.lsp.fm.features.keys() == server.lsp.fm.features.keys()
+    assert a.lsp.fm.commands.keys() == server.lsp.fm.commands.keys()
+    assert a.parse_cache is b.parse_cache
+    assert a.scheduler is b.scheduler is server.scheduler
+    assert a.lsp is not b.lsp
+    assert a._documents is not b._documents
+
+
+@pytest.mark.asyncio()
+async def test_tcp_clients_are_isolated(tcp_port: int):
+    """Test that concurrent TCP clients see only their own documents."""
+    uri = "file:///shared.spn"
+    a = await connect(tcp_port)
+    b = await connect(tcp_port)
+    await asyncio.gather(a.initialize(), b.initialize())
+
+    a.open(uri, "sof foo, 0\n")
+    b.open(uri, "sof 0, 0\n")
+
+    a_diagnostics, b_diagnostics = await asyncio.wait_for(
+        asyncio.gather(
+            a.wait_for("textDocument/publishDiagnostics"),
+            b.wait_for("textDocument/publishDiagnostics"),
+        ),
+        timeout=10,
+    )
+    assert [d["message"] for d in a_diagnostics["diagnostics"]] == [
+        "Undefined label foo"
+    ]
+    assert b_diagnostics["diagnostics"] == []
+
+    # Disconnecting one client leaves the others running
+    await a.wait_for(msg_id=a.send("shutdown", {}, request=True))
+    a.send("exit", {})
+    await asyncio.wait_for(a.reader.read(), timeout=10)
+    a.writer.close()
+
+    msg_id = b.send(
+        "textDocument/hover",
+        {"textDocument": {"uri": uri}, "position": {"line": 0, "character": 1}},
+        request=True,
+    )
+    hover = await asyncio.wait_for(b.wait_for(msg_id=msg_id), timeout=10)
+    assert "SOF" in hover["contents"]["value"]
+
+    b.writer.close()
@@ -6,7 +6,7 @@ import lsprotocol.types as lsp
 import pytest
 
 from spinasm_lsp.parser import SPINAsmParser
-from spinasm_lsp.tokens import ASFV1Token, LSPToken, TokenLookup
+from spinasm_lsp.tokens import ASFV1Token, LSPToken, TokenLookup, encode_semantics
 
 from .conftest import PATCH_DIR, TestCase, parametrize_cases
 
@@ -18,7 +18,7 @@ class TokenSemanticsTestCase(TestCase):
     token: LSPToken
     encoding: list[int]
     type: lsp.SemanticTokenTypes
-    modifiers: list[lsp.SemanticTokenModifiers] = field(default_factory=list)
+    modifiers: tuple[lsp.SemanticTokenModifiers, ...] = ()
     prev_token_start: lsp.Position = field(
         default_factory=lambda: lsp.Position(line=0, character=0)
     )
@@ -56,10 +56,10 @@ TOKEN_SEMANTICS: list[TokenSemanticsTestCase] = [
         ),
         encoding=[0, 5, 4, 8, 0b1000000100],
         type=lsp.SemanticTokenTypes.Variable,
-        modifiers=[
+        modifiers=(
             lsp.SemanticTokenModifiers.Readonly,
             lsp.SemanticTokenModifiers.DefaultLibrary,
-        ],
+        ),
         prev_token_start=lsp.Position(line=3, character=10),
     ),
 ]
@@ -162,8 +162,27 @@ def test_concatenate_cho_rdal_tokens():
 
     cho_rdal = cho.concatenate(rdal)
 
+    assert cho.stxt == "CHO"
+    assert cho.range.end == lsp.Position(line=0, character=3)
     assert cho_rdal.stxt == "CHO RDAL"
     assert cho_rdal.type == "MNEMONIC"
     assert cho_rdal.range == lsp.Range(
         start=lsp.Position(line=0, character=0), end=lsp.Position(line=0, character=14)
     )
+
+
+def test_encode_semantics_matches_token_encodings():
+    """Test that bulk encoding matches token encodings and skips unencoded tokens."""
+    parser = SPINAsmParser("Delay MEM 100\nrda Delay#, 0.5\nwrax REG0, -1.0\n")
+    tokens = list(parser.evaluated_tokens)
+
+    expected: list[int] = []
+    prev_token_start = lsp.Position(line=0, character=0)
+    for token in tokens:
+        if token_encoding := token.semantic_encoding(prev_token_start):
+            expected += token_encoding
+            prev_token_start = token.range.start
+
+    encoding = encode_semantics(tokens, len(tokens))
+    assert encoding.tolist() == expected
+    assert len(encoding) < 5 * len(tokens)